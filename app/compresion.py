@@ -0,0 +1,123 @@
+"""
+Compresión de respuestas y caché de los listados completos.
+
+Los listados completos (catálogo de productos, historial de ventas) se
+serializan y comprimen una sola vez por versión de su colección: mientras la
+colección no cambie, cada petición recibe los mismos bytes ya comprimidos con
+la mejor codificación que acepte el cliente. Brotli y zstd se usan solo si
+están instalados (``brotli``, ``zstandard``); gzip siempre está disponible.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from starlette.responses import Response
+
+from .config import settings
+
+def _comprimir_brotli(cuerpo: bytes) -> bytes:
+    import brotli
+    return brotli.compress(cuerpo, quality=settings.COMPRESION_NIVEL_BROTLI)
+
+def _comprimir_zstd(cuerpo: bytes) -> bytes:
+    import zstandard
+    return zstandard.ZstdCompressor(level=settings.COMPRESION_NIVEL_ZSTD).compress(cuerpo)
+
+def _comprimir_gzip(cuerpo: bytes) -> bytes:
+    return gzip.compress(cuerpo, compresslevel=settings.COMPRESION_NIVEL_GZIP, mtime=0)
+
+COMPRESORES: Dict[str, Callable[[bytes], bytes]] = {
+    "br": _comprimir_brotli,
+    "zstd": _comprimir_zstd,
+    "gzip": _comprimir_gzip,
+}
+MODULOS_OPCIONALES = {"br": "brotli", "zstd": "zstandard"}
+
+_disponibles: Optional[Tuple[str, ...]] = None
+
+def codificaciones_disponibles() -> Tuple[str, ...]:
+    """Codificaciones configuradas cuyo módulo está instalado, en orden de preferencia"""
+    global _disponibles
+    if _disponibles is None:
+        import importlib.util
+
+        _disponibles = tuple(
+            codificacion for codificacion in settings.COMPRESION_ALGORITMOS
+            if codificacion in COMPRESORES and (
+                codificacion not in MODULOS_OPCIONALES
+                or importlib.util.find_spec(MODULOS_OPCIONALES[codificacion]) is not None
+            )
+        )
+    return _disponibles
+
+def codificaciones_aceptadas(accept_encoding: Optional[str]) -> Set[str]:
+    """Codificaciones de la cabecera Accept-Encoding, sin las marcadas con q=0"""
+    aceptadas = set()
+    for parte in (accept_encoding or "").split(","):
+        codificacion, _, parametros = parte.strip().partition(";")
+        _, _, peso = parametros.replace(" ", "").partition("q=")
+        try:
+            if peso and float(peso) <= 0:
+                continue
+        except ValueError:
+            pass
+        if codificacion:
+            aceptadas.add(codificacion.lower())
+    return aceptadas
+
+def elegir_codificacion(accept_encoding: Optional[str]) -> Optional[str]:
+    """Primera codificación disponible que acepte el cliente (None: sin comprimir)"""
+    aceptadas = codificaciones_aceptadas(accept_encoding)
+    for codificacion in codificaciones_disponibles():
+        if codificacion in aceptadas or "*" in aceptadas:
+            return codificacion
+    return None
+
+def serializar_modelos(modelos: List[BaseModel]) -> bytes:
+    """JSON compacto de una lista de modelos, igual al que generaría FastAPI"""
+    return json.dumps([modelo.dict() for modelo in modelos], ensure_ascii=False,
+                      allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class CacheRespuestas:
+    """Cuerpos serializados y comprimidos por (clave, versión de la colección)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # clave -> (versión, hash del cuerpo, {codificación o "identity": cuerpo})
+        self._entradas: Dict[str, Tuple[int, str, Dict[str, bytes]]] = {}
+
+    def _cuerpo(self, clave: str, version: int, codificacion: Optional[str],
+                serializar: Callable[[], bytes]) -> Tuple[str, Optional[str], bytes]:
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[0] != version:
+                cuerpo = serializar()
+                entrada = (version, hashlib.blake2b(cuerpo, digest_size=16).hexdigest(), {"identity": cuerpo})
+                self._entradas[clave] = entrada
+            _, huella, cuerpos = entrada
+            if codificacion is None or len(cuerpos["identity"]) < settings.COMPRESION_MINIMA_BYTES:
+                return huella, None, cuerpos["identity"]
+            if codificacion not in cuerpos:
+                cuerpos[codificacion] = COMPRESORES[codificacion](cuerpos["identity"])
+            return huella, codificacion, cuerpos[codificacion]
+
+    def respuesta(self, clave: str, version: int, serializar: Callable[[], bytes],
+                  accept_encoding: Optional[str] = None, if_none_match: Optional[str] = None) -> Response:
+        """Respuesta JSON desde la caché, generándola solo si la colección cambió"""
+        codificacion = elegir_codificacion(accept_encoding) if settings.COMPRESION_ACTIVA else None
+        huella, codificacion, cuerpo = self._cuerpo(clave, version, codificacion, serializar)
+        # Cada codificación es una representación distinta y lleva su propio ETag
+        etag = f'"{huella}-{codificacion}"' if codificacion else f'"{huella}"'
+        headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+        if if_none_match and etag in (valor.strip().removeprefix("W/") for valor in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        if codificacion:
+            headers["Content-Encoding"] = codificacion
+        return Response(content=cuerpo, media_type="application/json", headers=headers)
+
+cache_respuestas = CacheRespuestas()
@@ -12,10 +12,81 @@ class Settings:
     # Configuración del servidor
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
-    RELOAD: bool = os.getenv("RELOAD", "true").lower() == "true"
+    # La recarga automática lanza un proceso vigilante extra; solo por defecto en desarrollo
+    RELOAD: bool = os.getenv(
+        "RELOAD", "true" if os.getenv("ENVIRONMENT", "development").lower() == "development" else "false"
+    ).lower() == "true"
+    # Con WORKERS > 1 las escrituras se coordinan mediante el bloqueo de archivo
+    # de la base de datos y cada worker invalida su caché por número de versión
+    WORKERS: int = int(os.getenv("WORKERS", "1"))
     
     # Configuración de la base de datos
     DATABASE_FILE: str = os.getenv("DATABASE_FILE", "pos_database.json")
+    # Hilos del executor que ejecuta la E/S de disco de los routers asíncronos
+    DB_EXECUTOR_WORKERS: int = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+    # Group commit: ventana (ms) para agrupar escrituras concurrentes en un solo guardado.
+    # 0 guarda cada escritura por separado; valores mayores suben la latencia de cada
+    # escritura a cambio de menos guardados. DB_FSYNC fuerza fsync antes de confirmar.
+    GROUP_COMMIT_MS: float = float(os.getenv("GROUP_COMMIT_MS", "0"))
+    DB_FSYNC: bool = os.getenv("DB_FSYNC", "false").lower() == "true"
+    
+    # Formato de los ids nuevos: "uuid4" (aleatorio) o "uuid7" (ordenado por tiempo,
+    # permite ubicar las ventas por rango de fechas directamente desde su id)
+    ID_FORMAT: str = os.getenv("ID_FORMAT", "uuid4").lower()
+    
+    # Qué hacer al eliminar un producto o cliente con ventas asociadas:
+    # "rechazar" responde 409, "archivar" lo da de baja lógica conservando el historial
+    DELETE_MODE: str = os.getenv("DELETE_MODE", "rechazar")
+    
+    # Umbral de reposición para productos sin stock_minimo propio
+    STOCK_MINIMO_DEFAULT: int = int(os.getenv("STOCK_MINIMO_DEFAULT", "5"))
+    
+    # "Comprados juntos": compañeros por producto a devolver (se guardan hasta 4x) y
+    # procesos para el conteo inicial al arrancar cuando el historial supera el umbral
+    RELACIONADOS_TOP_K: int = int(os.getenv("RELACIONADOS_TOP_K", "10"))
+    COOCURRENCIA_PROCESOS: int = int(os.getenv("COOCURRENCIA_PROCESOS", "1"))
+    COOCURRENCIA_UMBRAL_PARALELO: int = int(os.getenv("COOCURRENCIA_UMBRAL_PARALELO", "100000"))
+    
+    # Compresión de respuestas: algoritmos en orden de preferencia (br y zstd solo si
+    # están instalados los paquetes brotli / zstandard) y tamaño mínimo a comprimir
+    COMPRESION_ACTIVA: bool = os.getenv("COMPRESION_ACTIVA", "true").lower() == "true"
+    COMPRESION_ALGORITMOS: list = [
+        algoritmo.strip() for algoritmo in os.getenv("COMPRESION_ALGORITMOS", "br,zstd,gzip").split(",") if algoritmo.strip()
+    ]
+    COMPRESION_MINIMA_BYTES: int = int(os.getenv("COMPRESION_MINIMA_BYTES", "1024"))
+    COMPRESION_NIVEL_GZIP: int = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))
+    COMPRESION_NIVEL_BROTLI: int = int(os.getenv("COMPRESION_NIVEL_BROTLI", "5"))
+    COMPRESION_NIVEL_ZSTD: int = int(os.getenv("COMPRESION_NIVEL_ZSTD", "3"))
+    # Segundos que uvicorn mantiene abierta una conexión inactiva: las cajas hacen
+    # peticiones seguidas y así evitan reabrir la conexión en cada venta
+    TIMEOUT_KEEP_ALIVE: int = int(os.getenv("TIMEOUT_KEEP_ALIVE", "30"))
+    
+    # Límite de peticiones por cliente y ruta (tokens por segundo y ráfaga máxima);
+    # los reportes tienen su propio límite, más estricto
+    LIMITES_ACTIVOS: bool = os.getenv("LIMITES_ACTIVOS", "true").lower() == "true"
+    LIMITE_TASA: float = float(os.getenv("LIMITE_TASA", "20"))
+    LIMITE_RAFAGA: float = float(os.getenv("LIMITE_RAFAGA", "40"))
+    LIMITE_TASA_REPORTES: float = float(os.getenv("LIMITE_TASA_REPORTES", "1"))
+    LIMITE_RAFAGA_REPORTES: float = float(os.getenv("LIMITE_RAFAGA_REPORTES", "5"))
+    LIMITE_MAX_CUBOS: int = int(os.getenv("LIMITE_MAX_CUBOS", "10000"))
+    # Descarte de carga: con más escrituras en cola o más retraso del bucle de eventos
+    # que estos umbrales se rechazan los reportes (y con el doble, todo salvo las ventas)
+    CARGA_COLA_ESCRITURAS_MAX: int = int(os.getenv("CARGA_COLA_ESCRITURAS_MAX", "32"))
+    CARGA_RETRASO_MAX_MS: float = float(os.getenv("CARGA_RETRASO_MAX_MS", "200"))
+    CARGA_MUESTREO_MS: float = float(os.getenv("CARGA_MUESTREO_MS", "100"))
+    CARGA_RETRY_AFTER_SEGUNDOS: int = int(os.getenv("CARGA_RETRY_AFTER_SEGUNDOS", "2"))
+    
+    # Idempotency-Key en peticiones POST: vigencia de las respuestas guardadas,
+    # máximo de entradas (en la caché LRU de cada proceso y en <db>.idempotencia) y
+    # cuánto dura la reclamación de una petición en curso si su worker muere
+    IDEMPOTENCIA_TTL_SEGUNDOS: float = float(os.getenv("IDEMPOTENCIA_TTL_SEGUNDOS", "86400"))
+    IDEMPOTENCIA_MAX_ENTRADAS: int = int(os.getenv("IDEMPOTENCIA_MAX_ENTRADAS", "10000"))
+    IDEMPOTENCIA_PENDIENTE_SEGUNDOS: float = float(os.getenv("IDEMPOTENCIA_PENDIENTE_SEGUNDOS", "60"))
+    
+    # Ventanas deslizantes (en minutos) disponibles para el reporte de productos populares
+    POPULARES_VENTANAS_MINUTOS: list = [
+        int(minutos) for minutos in os.getenv("POPULARES_VENTANAS_MINUTOS", "60,1440").split(",") if minutos
+    ]
     
     # Configuración de CORS
     CORS_ORIGINS: list = [
@@ -36,6 +107,11 @@ class Settings:
         """Obtiene la URL de la base de datos"""
         return cls.DATABASE_FILE
     
+    @classmethod
+    def should_reload(cls) -> bool:
+        """La recarga automática de uvicorn solo es compatible con un único worker"""
+        return cls.RELOAD and cls.WORKERS <= 1
+    
     @classmethod
     def is_development(cls) -> bool:
         """Verifica si estamos en modo desarrollo"""
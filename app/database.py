@@ -1,17 +1,242 @@
+import asyncio
+import functools
 import json
+import mmap
 import os
-from typing import Dict, List, Any, Optional
+import stat
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Callable, Tuple, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos, solo un worker
+    fcntl = None
 
 from .config import settings
+from .indices import CLIENTE, PRODUCTO, VENTA, Cambio, Indices, archivado, clave_temporal, productos_de_venta
+from .inventario import EventoStock
+from .reportes_paralelos import MotorReportes, Parcial, combinar
+
+T = TypeVar("T")
+
+def _modo_archivos_nuevos() -> int:
+    """Permisos que tendría un archivo creado con ``open``; se consulta al importar,
+    porque leer la umask requiere cambiarla un instante para todo el proceso"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+MODO_ARCHIVOS_NUEVOS = _modo_archivos_nuevos()
+
+def sincronizar_directorio(path: str) -> None:
+    """Lleva a disco la entrada de directorio de ``path`` (p. ej. tras un rename);
+    sin esto un corte de luz puede deshacer el rename aunque el archivo tuviera fsync"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:  # Windows no permite abrir directorios
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class RegistroDuplicadoError(ValueError):
+    """Se intentó guardar un valor ya usado en un campo único"""
+
+    def __init__(self, campo: str):
+        super().__init__(f"Ya existe un registro con ese {campo}")
+        self.campo = campo
+
+class RegistroReferenciadoError(ValueError):
+    """Se intentó eliminar un registro al que todavía referencian ventas"""
+
+    def __init__(self, referencias: int):
+        super().__init__(f"El registro tiene {referencias} ventas asociadas")
+        self.referencias = referencias
+
+class ContadorVersion:
+    """Contador de versión compartido entre procesos en ``<db>.version``.
+
+    El archivo se proyecta en memoria (mmap): consultar la versión es leer unos
+    bytes de memoria compartida, sin llamadas al sistema, y todos los procesos
+    ven el mismo valor. Solo se incrementa con el bloqueo de escritura tomado.
+    """
+
+    ANCHO = 20
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mapa: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+    def _abrir(self) -> mmap.mmap:
+        with self._lock:
+            if self._mapa is None:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_EX)
+                    contenido = os.read(fd, 64)
+                    if len(contenido) != self.ANCHO:
+                        # Archivo nuevo o con el formato anterior (número sin relleno)
+                        try:
+                            valor = int(contenido or 0)
+                        except ValueError:
+                            valor = 0
+                        os.ftruncate(fd, 0)
+                        os.lseek(fd, 0, os.SEEK_SET)
+                        os.write(fd, b"%0*d" % (self.ANCHO, valor))
+                    self._mapa = mmap.mmap(fd, self.ANCHO)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+                    os.close(fd)
+            return self._mapa
+
+    def leer(self) -> int:
+        return int((self._mapa or self._abrir())[:self.ANCHO])
+
+    def incrementar(self) -> int:
+        mapa = self._mapa or self._abrir()
+        version = int(mapa[:self.ANCHO]) + 1
+        mapa[:self.ANCHO] = b"%0*d" % (self.ANCHO, version)
+        return version
+
+class RegistroInexistenteError(ValueError):
+    """Una venta referencia un cliente o producto que no existe o está archivado"""
+
+    def __init__(self, coleccion: str, registro_id: str):
+        super().__init__(f"No existe el {coleccion} {registro_id}")
+        self.coleccion = coleccion
+        self.registro_id = registro_id
+
+class StockInsuficienteError(ValueError):
+    """Una venta pide más unidades de las que quedan en stock"""
+
+    def __init__(self, producto: Dict[str, Any]):
+        super().__init__(f"Stock insuficiente para {producto['nombre']}")
+        self.producto = producto
+
+class _Lote:
+    """Grupo de escrituras que se persisten juntas en un único guardado.
+
+    ``data`` es el estado con todos los cambios del lote y ``cambios`` las
+    actualizaciones de índices que se aplican cuando el lote llega a disco;
+    hasta entonces las lecturas siguen viendo la última versión persistida.
+    """
+
+    def __init__(self, leader: int):
+        self.leader = leader
+        self.data: Optional[Dict[str, List[Any]]] = None
+        self.cambios: List[Cambio] = []
+        # Registros escritos en el lote por id (None si se eliminó), para que las
+        # validaciones de las escrituras siguientes vean el estado pendiente
+        self.productos: Dict[str, Optional[Dict[str, Any]]] = {}
+        self.clientes: Dict[str, Optional[Dict[str, Any]]] = {}
+        self.ventas: List[Dict[str, Any]] = []
+        # Eventos de inventario del lote, que emite el líder una vez guardado
+        self.eventos: List[EventoStock] = []
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+    def agregar(self, data: Dict[str, List[Any]], cambios: List[Cambio]) -> None:
+        self.data = data
+        self.cambios.extend(cambios)
+        for tipo, *args in cambios:
+            if tipo == VENTA:
+                self.ventas.append(args[0])
+            else:
+                anterior, nuevo = args
+                registros = self.productos if tipo == PRODUCTO else self.clientes
+                registros[(nuevo or anterior)["id"]] = nuevo
+
+def _durable(method):
+    """Devuelve el resultado solo cuando el lote que contiene la escritura está en disco"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._wait_for_commit()
+        return result
+    return wrapper
 
 class DatabaseManager:
-    def __init__(self, db_file: str = None):
+    """Gestor del archivo JSON compartido por todos los workers.
+
+    Las escrituras se serializan con un bloqueo de archivo (``<db>.lock``), se
+    publican de forma atómica y luego incrementan un contador de versión
+    compartido (``<db>.version``, proyectado en memoria). Cada proceso conserva
+    en memoria la última versión leída y solo vuelve a leer el archivo cuando
+    otro proceso publica una versión nueva. Las colecciones
+    en caché se tratan como inmutables: las escrituras sustituyen listas y
+    registros en lugar de modificarlos en sitio.
+
+    Con ``group_commit_ms > 0`` las escrituras concurrentes se agrupan: se
+    acumulan en un lote pendiente, el primer escritor del lote espera la ventana
+    configurada y guarda una sola vez, y cada escritor recibe respuesta cuando su
+    lote está en disco. El bloqueo de archivo se mantiene durante todo el lote.
+
+    Los índices en memoria (``app.indices``) se reconstruyen al cargar el archivo.
+    Cada escritura registra sus cambios de índices y estos se aplican, junto con
+    la nueva versión, solo después de guardar: las lecturas nunca ven datos que
+    todavía no están en disco. Los eventos de inventario que producen se emiten
+    después, sin ningún bloqueo tomado.
+    """
+
+    def __init__(self, db_file: str = None, group_commit_ms: float = None, fsync: bool = None):
         self.db_file = db_file or settings.get_database_url()
+        self.version_file = f"{self.db_file}.version"
+        self._contador = ContadorVersion(self.version_file)
+        self.lock_file = f"{self.db_file}.lock"
+        self.group_commit_ms = settings.GROUP_COMMIT_MS if group_commit_ms is None else group_commit_ms
+        self.fsync = settings.DB_FSYNC if fsync is None else fsync
+        self._lock = threading.RLock()
+        self._lock_fd = None
+        self._lote: Optional[_Lote] = None
+        self._local = threading.local()
+        self._data: Optional[Dict[str, List[Any]]] = None
+        self._version: Optional[int] = None
+        self._indices = Indices()
+        self._reportes = MotorReportes()
+        # colección -> (lista vista por última vez, versión)
+        self._versiones_colecciones: Dict[str, Tuple[List[Any], int]] = {}
+        self._versiones_lock = threading.Lock()
+    
+    def open(self) -> None:
+        """Abre el almacenamiento y precarga la caché (se invoca desde el lifespan de la app).
+
+        El constructor no toca el sistema de archivos, de modo que importar el módulo
+        es inmediato; si no se llama a ``open`` la base se abre en el primer acceso.
+        """
         self._ensure_database_exists()
+        self.load_database()
+        # Conteo inicial de "comprados juntos", fuera de las peticiones; las recargas
+        # posteriores solo suman las ventas nuevas
+        if self._indices.coocurrencias is None:
+            self._indices.preparar_coocurrencias(settings.COOCURRENCIA_PROCESOS)
     
     def _ensure_database_exists(self):
         """Asegura que el archivo de base de datos existe con la estructura correcta"""
         if not os.path.exists(self.db_file):
+            self._crear_si_no_hay()
+    
+    def _crear_si_no_hay(self) -> None:
+        """Guarda una base vacía si el archivo falta o no se puede leer.
+
+        Se comprueba de nuevo con el bloqueo de escritura tomado: otro worker que
+        arrancó a la vez pudo crearla y registrar datos mientras se esperaba.
+        """
+        with self._write_lock():
+            try:
+                with open(self.db_file, 'r', encoding='utf-8') as f:
+                    json.load(f)
+                return
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
             initial_data = {
                 "productos": [],
                 "clientes": [],
@@ -19,141 +244,587 @@ class DatabaseManager:
             }
             self.save_database(initial_data)
     
-    def load_database(self) -> Dict[str, List[Any]]:
-        """Carga la base de datos desde el archivo JSON"""
+    def _read_version(self) -> int:
+        """Lee el contador de versión compartido entre procesos"""
+        return self._contador.leer()
+    
+    def _write_atomic(self, path: str, content: str) -> None:
+        """Escribe un archivo completo y lo publica con un rename atómico"""
+        directory = os.path.dirname(os.path.abspath(path))
         try:
-            with open(self.db_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            # Si hay error, crear una nueva base de datos
-            initial_data = {
-                "productos": [],
-                "clientes": [],
-                "ventas": []
-            }
-            self.save_database(initial_data)
-            return initial_data
+            modo = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            modo = MODO_ARCHIVOS_NUEVOS
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            # mkstemp crea el archivo con 0600 y el rename conserva ese modo: se
+            # mantienen los permisos del archivo que se reemplaza
+            os.chmod(tmp_path, modo)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            if self.fsync:
+                sincronizar_directorio(path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    @contextmanager
+    def _write_lock(self):
+        """Serializa a los escritores entre hilos y entre procesos"""
+        with self._lock:
+            acquired = False
+            if self._lock_fd is None and fcntl is not None:
+                self._lock_fd = open(self.lock_file, 'a')
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+                acquired = True
+            try:
+                yield
+            finally:
+                # Si se abrió un lote, el bloqueo se libera al persistirlo
+                if acquired and self._lote is None:
+                    self._release_file_lock()
+    
+    def _release_file_lock(self) -> None:
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            self._lock_fd.close()
+            self._lock_fd = None
+    
+    def _commit(self, data: Dict[str, List[Any]], cambios: List[Cambio]) -> None:
+        """Agrega una escritura al lote en curso; sin group commit lo guarda de inmediato"""
+        if self._lote is None:
+            self._lote = _Lote(leader=threading.get_ident())
+        self._lote.agregar(data, cambios)
+        self._local.lote = self._lote
+        if self.group_commit_ms <= 0:
+            self._flush(self._lote)
+    
+    def _wait_for_commit(self) -> None:
+        """Espera a que se persista el lote de la escritura del hilo actual"""
+        lote = getattr(self._local, "lote", None)
+        if lote is None:
+            return
+        self._local.lote = None
+        if lote.leader == threading.get_ident():
+            if not lote.done.is_set():
+                time.sleep(self.group_commit_ms / 1000)
+                self._flush(lote)
+            # Fuera de los bloqueos: un suscriptor lento no detiene otras escrituras
+            self._indices.inventario.emitir(lote.eventos)
+        else:
+            lote.done.wait()
+        if lote.error is not None:
+            raise lote.error
+    
+    def _flush(self, lote: _Lote) -> None:
+        """Guarda de una vez todas las escrituras del lote y después las publica"""
+        with self._lock:
+            try:
+                self._persist(lote.data)
+                lote.eventos = self._publicar(lote.data, lote.cambios)
+            except BaseException as exc:
+                lote.error = exc
+                # Se vuelve a leer el archivo, que refleja lo que realmente se guardó
+                self._data = None
+            finally:
+                self._lote = None
+                self._release_file_lock()
+                lote.done.set()
+    
+    def _publicar(self, data: Dict[str, List[Any]], cambios: List[Cambio]) -> List[EventoStock]:
+        """Aplica a los índices los cambios ya persistidos y publica la nueva versión"""
+        with self._indices.lock:
+            eventos = self._indices.aplicar(cambios)
+            self._data, self._version = data, self._contador.incrementar()
+        return eventos
+    
+    def is_fresh(self) -> bool:
+        """Indica si la caché en memoria corresponde a la última versión publicada"""
+        return self._data is not None and self._read_version() == self._version
+    
+    def _snapshot(self) -> Dict[str, List[Any]]:
+        """Copia superficial del estado más reciente, incluido el lote pendiente, para
+        modificarla dentro de una escritura"""
+        if self._lote is not None and self._lote.data is not None:
+            return dict(self._lote.data)
+        return dict(self.load_database())
+    
+    def load_database(self) -> Dict[str, List[Any]]:
+        """Carga la base de datos, reutilizando la caché mientras la versión no cambie"""
+        if self._data is not None and self._read_version() == self._version:
+            return self._data
+        with self._indices.lock:
+            # Un solo hilo recarga; los demás reutilizan su resultado
+            version = self._read_version()
+            if self._data is not None and version == self._version:
+                return self._data
+            try:
+                with open(self.db_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                data = None
+            if data is not None:
+                self._indices.reconstruir(data)
+                self._data, self._version = data, version
+                return data
+        # Si hay error, crear una nueva base de datos (o leer la que creó otro worker)
+        self._crear_si_no_hay()
+        return self.load_database()
     
     def save_database(self, data: Dict[str, List[Any]]) -> None:
-        """Guarda la base de datos en el archivo JSON"""
-        with open(self.db_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """Guarda la base de datos en el archivo JSON y publica una nueva versión"""
+        with self._write_lock():
+            self._persist(data)
+            with self._indices.lock:
+                self._indices.reconstruir(data)
+                self._data, self._version = data, self._contador.incrementar()
     
-    def get_productos(self) -> List[Dict[str, Any]]:
+    def _persist(self, data: Dict[str, List[Any]]) -> None:
+        # JSON compacto: sin ``indent`` json usa el codificador en C, varias veces más
+        # rápido, y el guardado retiene menos tiempo el GIL que comparte con las lecturas
+        self._write_atomic(self.db_file, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    
+    def _producto_vigente(self, producto_id: str) -> Optional[Dict[str, Any]]:
+        """Producto con los cambios del lote pendiente (solo dentro de una escritura)"""
+        if self._lote is not None and producto_id in self._lote.productos:
+            return self._lote.productos[producto_id]
+        return self._indices.productos.get(producto_id)
+    
+    def _cliente_vigente(self, cliente_id: str) -> Optional[Dict[str, Any]]:
+        """Cliente con los cambios del lote pendiente (solo dentro de una escritura)"""
+        if self._lote is not None and cliente_id in self._lote.clientes:
+            return self._lote.clientes[cliente_id]
+        return self._indices.clientes.get(cliente_id)
+    
+    def _ventas_pendientes(self) -> List[Dict[str, Any]]:
+        return self._lote.ventas if self._lote is not None else []
+    
+    def version_coleccion(self, nombre: str) -> int:
+        """Versión de una colección en este proceso.
+
+        Las escrituras nunca modifican una lista en el lugar: la reemplazan por
+        otra. Basta entonces comparar por identidad con la última lista vista para
+        saber si la colección cambió, sin contadores en el archivo.
+        """
+        lista = self.load_database()[nombre]
+        with self._versiones_lock:
+            vista, version = self._versiones_colecciones.get(nombre, (None, 0))
+            if vista is not lista:
+                version += 1
+                self._versiones_colecciones[nombre] = (lista, version)
+            return version
+    
+    def get_productos(self, incluir_archivados: bool = False) -> List[Dict[str, Any]]:
         """Obtiene todos los productos"""
         db = self.load_database()
-        return db["productos"]
+        if incluir_archivados or not self._indices.archivados["productos"]:
+            return db["productos"]
+        return [producto for producto in db["productos"] if not archivado(producto)]
     
-    def get_producto_by_id(self, producto_id: str) -> Optional[Dict[str, Any]]:
+    def get_producto_by_id(self, producto_id: str, incluir_archivados: bool = False) -> Optional[Dict[str, Any]]:
         """Obtiene un producto por su ID"""
-        productos = self.get_productos()
-        for producto in productos:
-            if producto["id"] == producto_id:
-                return producto
-        return None
+        self.load_database()
+        producto = self._indices.productos.get(producto_id)
+        if archivado(producto) and not incluir_archivados:
+            return None
+        return producto
+    
+    def count_ventas_producto(self, producto_id: str) -> int:
+        """Número de ventas que incluyen el producto (índice inverso, O(1))"""
+        self.load_database()
+        return self._indices.ventas_por_producto.contar(producto_id)
     
+    @_durable
     def add_producto(self, producto: Dict[str, Any]) -> None:
         """Agrega un nuevo producto"""
-        db = self.load_database()
-        db["productos"].append(producto)
-        self.save_database(db)
+        with self._write_lock():
+            db = self._snapshot()
+            db["productos"] = db["productos"] + [producto]
+            self._commit(db, [(PRODUCTO, None, producto)])
     
+    @_durable
     def update_producto(self, producto_id: str, producto_data: Dict[str, Any]) -> bool:
         """Actualiza un producto existente"""
-        db = self.load_database()
-        for i, producto in enumerate(db["productos"]):
-            if producto["id"] == producto_id:
-                producto_data["id"] = producto_id
-                producto_data["fecha_creacion"] = producto["fecha_creacion"]
-                db["productos"][i] = producto_data
-                self.save_database(db)
-                return True
-        return False
+        with self._write_lock():
+            db = self._snapshot()
+            for i, producto in enumerate(db["productos"]):
+                if producto["id"] == producto_id:
+                    producto_data["id"] = producto_id
+                    producto_data["fecha_creacion"] = producto["fecha_creacion"]
+                    productos = list(db["productos"])
+                    productos[i] = producto_data
+                    db["productos"] = productos
+                    self._commit(db, [(PRODUCTO, producto, producto_data)])
+                    return True
+            return False
     
+    @_durable
     def delete_producto(self, producto_id: str) -> bool:
-        """Elimina un producto"""
-        db = self.load_database()
-        for i, producto in enumerate(db["productos"]):
-            if producto["id"] == producto_id:
-                del db["productos"][i]
-                self.save_database(db)
-                return True
-        return False
-    
-    def get_clientes(self) -> List[Dict[str, Any]]:
+        """Elimina un producto; si tiene ventas asociadas lanza RegistroReferenciadoError"""
+        with self._write_lock():
+            db = self._snapshot()
+            referencias = self._indices.ventas_por_producto.contar(producto_id) + sum(
+                producto_id in productos_de_venta(venta) for venta in self._ventas_pendientes()
+            )
+            for i, producto in enumerate(db["productos"]):
+                if producto["id"] == producto_id:
+                    if referencias:
+                        raise RegistroReferenciadoError(referencias)
+                    db["productos"] = db["productos"][:i] + db["productos"][i + 1:]
+                    self._commit(db, [(PRODUCTO, producto, None)])
+                    return True
+            return False
+    
+    @_durable
+    def archive_producto(self, producto_id: str) -> bool:
+        """Baja lógica: el producto se conserva para el historial de ventas pero deja de listarse"""
+        with self._write_lock():
+            db = self._snapshot()
+            for i, producto in enumerate(db["productos"]):
+                if producto["id"] == producto_id:
+                    productos = list(db["productos"])
+                    productos[i] = {**producto, "archivado": True}
+                    db["productos"] = productos
+                    self._commit(db, [(PRODUCTO, producto, productos[i])])
+                    return True
+            return False
+    
+    def get_clientes(self, incluir_archivados: bool = False) -> List[Dict[str, Any]]:
         """Obtiene todos los clientes"""
         db = self.load_database()
-        return db["clientes"]
+        if incluir_archivados or not self._indices.archivados["clientes"]:
+            return db["clientes"]
+        return [cliente for cliente in db["clientes"] if not archivado(cliente)]
     
-    def get_cliente_by_id(self, cliente_id: str) -> Optional[Dict[str, Any]]:
+    def get_cliente_by_id(self, cliente_id: str, incluir_archivados: bool = False) -> Optional[Dict[str, Any]]:
         """Obtiene un cliente por su ID"""
-        clientes = self.get_clientes()
-        for cliente in clientes:
-            if cliente["id"] == cliente_id:
-                return cliente
-        return None
+        self.load_database()
+        cliente = self._indices.clientes.get(cliente_id)
+        if archivado(cliente) and not incluir_archivados:
+            return None
+        return cliente
+    
+    def count_ventas_cliente(self, cliente_id: str) -> int:
+        """Número de ventas del cliente (índice inverso, O(1))"""
+        self.load_database()
+        return self._indices.ventas_por_cliente.contar(cliente_id)
     
+    def find_cliente(self, email: Optional[str] = None, telefono: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Busca un cliente por email o por los dígitos de su teléfono en O(1)"""
+        self.load_database()
+        return self._indices.buscar_cliente(email, telefono)
+    
+    def _check_cliente_unico(self, cliente: Dict[str, Any]) -> None:
+        campo = self._indices.cliente_duplicado(cliente, self._lote.clientes if self._lote else None)
+        if campo is not None:
+            raise RegistroDuplicadoError(campo)
+    
+    @_durable
     def add_cliente(self, cliente: Dict[str, Any]) -> None:
         """Agrega un nuevo cliente"""
-        db = self.load_database()
-        db["clientes"].append(cliente)
-        self.save_database(db)
+        with self._write_lock():
+            db = self._snapshot()
+            self._check_cliente_unico(cliente)
+            db["clientes"] = db["clientes"] + [cliente]
+            self._commit(db, [(CLIENTE, None, cliente)])
     
+    @_durable
     def update_cliente(self, cliente_id: str, cliente_data: Dict[str, Any]) -> bool:
         """Actualiza un cliente existente"""
-        db = self.load_database()
-        for i, cliente in enumerate(db["clientes"]):
-            if cliente["id"] == cliente_id:
-                cliente_data["id"] = cliente_id
-                cliente_data["fecha_registro"] = cliente["fecha_registro"]
-                db["clientes"][i] = cliente_data
-                self.save_database(db)
-                return True
-        return False
+        with self._write_lock():
+            db = self._snapshot()
+            for i, cliente in enumerate(db["clientes"]):
+                if cliente["id"] == cliente_id:
+                    cliente_data["id"] = cliente_id
+                    cliente_data["fecha_registro"] = cliente["fecha_registro"]
+                    self._check_cliente_unico(cliente_data)
+                    clientes = list(db["clientes"])
+                    clientes[i] = cliente_data
+                    db["clientes"] = clientes
+                    self._commit(db, [(CLIENTE, cliente, cliente_data)])
+                    return True
+            return False
     
+    @_durable
     def delete_cliente(self, cliente_id: str) -> bool:
-        """Elimina un cliente"""
-        db = self.load_database()
-        for i, cliente in enumerate(db["clientes"]):
-            if cliente["id"] == cliente_id:
-                del db["clientes"][i]
-                self.save_database(db)
-                return True
-        return False
+        """Elimina un cliente; si tiene ventas asociadas lanza RegistroReferenciadoError"""
+        with self._write_lock():
+            db = self._snapshot()
+            referencias = self._indices.ventas_por_cliente.contar(cliente_id) + sum(
+                venta["cliente_id"] == cliente_id for venta in self._ventas_pendientes()
+            )
+            for i, cliente in enumerate(db["clientes"]):
+                if cliente["id"] == cliente_id:
+                    if referencias:
+                        raise RegistroReferenciadoError(referencias)
+                    db["clientes"] = db["clientes"][:i] + db["clientes"][i + 1:]
+                    self._commit(db, [(CLIENTE, cliente, None)])
+                    return True
+            return False
+    
+    @_durable
+    def archive_cliente(self, cliente_id: str) -> bool:
+        """Baja lógica: el cliente se conserva para el historial de ventas pero deja de listarse"""
+        with self._write_lock():
+            db = self._snapshot()
+            for i, cliente in enumerate(db["clientes"]):
+                if cliente["id"] == cliente_id:
+                    clientes = list(db["clientes"])
+                    clientes[i] = {**cliente, "archivado": True}
+                    db["clientes"] = clientes
+                    self._commit(db, [(CLIENTE, cliente, clientes[i])])
+                    return True
+            return False
     
     def get_ventas(self) -> List[Dict[str, Any]]:
         """Obtiene todas las ventas"""
         db = self.load_database()
         return db["ventas"]
     
+    def get_ventas_entre(self, desde: Optional[float] = None, hasta: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Ventas entre dos instantes (segundos desde epoch), en orden cronológico"""
+        self.load_database()
+        return self._indices.ventas_entre(desde, hasta)
+    
     def get_venta_by_id(self, venta_id: str) -> Optional[Dict[str, Any]]:
         """Obtiene una venta por su ID"""
-        ventas = self.get_ventas()
-        for venta in ventas:
-            if venta["id"] == venta_id:
-                return venta
-        return None
+        self.load_database()
+        return self._indices.ventas.get(venta_id)
     
+    @_durable
     def add_venta(self, venta: Dict[str, Any]) -> None:
         """Agrega una nueva venta"""
-        db = self.load_database()
-        db["ventas"].append(venta)
-        self.save_database(db)
+        with self._write_lock():
+            db = self._snapshot()
+            self._insertar_venta(db, venta)
+            self._commit(db, [(VENTA, venta)])
+    
+    @_durable
+    def registrar_venta(self, venta: Dict[str, Any]) -> None:
+        """Descuenta el stock de los items y agrega la venta en una sola escritura.
+
+        El cliente, los productos y el stock se validan con el bloqueo de escritura
+        tomado y sobre el estado más reciente (incluido el lote pendiente), así dos
+        ventas simultáneas, de este o de otro worker, no venden las mismas unidades.
+        Lanza RegistroInexistenteError o StockInsuficienteError sin escribir nada.
+        """
+        with self._write_lock():
+            db = self._snapshot()
+            cliente = self._cliente_vigente(venta["cliente_id"])
+            if cliente is None or archivado(cliente):
+                raise RegistroInexistenteError("cliente", venta["cliente_id"])
+            cantidades: Dict[str, int] = {}
+            for item in venta["items"]:
+                cantidades[item["producto_id"]] = cantidades.get(item["producto_id"], 0) + item["cantidad"]
+            for producto_id, cantidad in cantidades.items():
+                producto = self._producto_vigente(producto_id)
+                if producto is None or archivado(producto):
+                    raise RegistroInexistenteError("producto", producto_id)
+                if producto["stock"] < cantidad:
+                    raise StockInsuficienteError(producto)
+            cambios: List[Cambio] = []
+            productos = list(db["productos"])
+            for i, producto in enumerate(productos):
+                if producto["id"] in cantidades:
+                    productos[i] = {**producto, "stock": producto["stock"] - cantidades[producto["id"]]}
+                    cambios.append((PRODUCTO, producto, productos[i]))
+            db["productos"] = productos
+            self._insertar_venta(db, venta)
+            self._commit(db, cambios + [(VENTA, venta)])
+    
+    def _insertar_venta(self, db: Dict[str, List[Any]], venta: Dict[str, Any]) -> None:
+        """Agrega la venta al historial manteniéndolo ordenado por momento"""
+        ventas = list(db["ventas"])
+        posicion = len(ventas)
+        if self._indices.orden_coincide:
+            # Solo retrocede con ids generados en otro worker un instante antes
+            clave = clave_temporal(venta)
+            while posicion and clave_temporal(ventas[posicion - 1]) > clave:
+                posicion -= 1
+        ventas.insert(posicion, venta)
+        db["ventas"] = ventas
     
     def get_ventas_by_cliente(self, cliente_id: str) -> List[Dict[str, Any]]:
         """Obtiene todas las ventas de un cliente específico"""
-        ventas = self.get_ventas()
-        return [venta for venta in ventas if venta["cliente_id"] == cliente_id]
+        self.load_database()
+        return self._indices.ventas_de_cliente(cliente_id)
     
+    @_durable
     def update_producto_stock(self, producto_id: str, cantidad: int) -> bool:
         """Actualiza el stock de un producto"""
-        db = self.load_database()
-        for producto in db["productos"]:
-            if producto["id"] == producto_id:
-                producto["stock"] -= cantidad
-                self.save_database(db)
-                return True
-        return False
+        with self._write_lock():
+            db = self._snapshot()
+            for i, producto in enumerate(db["productos"]):
+                if producto["id"] == producto_id:
+                    productos = list(db["productos"])
+                    productos[i] = {**producto, "stock": producto["stock"] - cantidad}
+                    db["productos"] = productos
+                    self._commit(db, [(PRODUCTO, producto, productos[i])])
+                    return True
+            return False
+
+    def get_productos_bajo_stock(self, limit: Optional[int] = None) -> List[Tuple[Dict[str, Any], int]]:
+        """Productos en o por debajo de su umbral de reposición, con dicho umbral"""
+        self.load_database()
+        return self._indices.bajo_stock(limit)
+    
+    def suscribir_inventario(self, callback: Callable[[EventoStock], None]) -> None:
+        """Registra una función que recibe los eventos de cruce de umbral de stock"""
+        self._indices.inventario.suscribir(callback)
+    
+    def get_productos_relacionados(self, producto_id: str, limit: int) -> List[Tuple[Dict[str, Any], int]]:
+        """Productos comprados frecuentemente junto a ``producto_id``"""
+        self.load_database()
+        return self._indices.relacionados(producto_id, limit)
+    
+    def get_rfm_clientes(self) -> List[Tuple[str, Any, int, int, int, str]]:
+        """Puntuaciones RFM de los clientes con compras, desde los acumulados por cliente"""
+        self.load_database()
+        return self._indices.rfm_clientes()
+    
+    def get_top_productos(self, limit: int, categoria: Optional[str] = None,
+                          ventana_minutos: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Productos más vendidos como pares (producto_id, cantidad) desde los índices"""
+        self.load_database()
+        return self._indices.top_productos(limit, categoria, ventana_minutos)
+
+    def get_reporte_ventas(self, agrupacion: str = "dia", desde: Optional[str] = None,
+                           hasta: Optional[str] = None) -> Parcial:
+        """Agregados de ventas combinando los parciales de cada mes entre ``desde`` y ``hasta``"""
+        self.load_database()
+        cache = self._reportes.cache()
+        nuevas = self._indices.particiones_por_mes(desde, hasta, cache)
+        return combinar(self._reportes.parciales(nuevas, cache), agrupacion)
+
+class TurnosEscritura:
+    """Semáforo de escrituras con dos colas: los turnos libres van primero a las
+    prioritarias (cobrar una venta) y, si hay más de un turno, uno queda
+    reservado para ellas.
+    """
+
+    def __init__(self, turnos: int):
+        self.turnos = turnos
+        self.reservados = 1 if turnos > 1 else 0
+        self.en_curso = 0
+        self._prioritarias: "deque[asyncio.Future]" = deque()
+        self._normales: "deque[asyncio.Future]" = deque()
+
+    def _limite(self, prioritaria: bool) -> int:
+        return self.turnos if prioritaria else self.turnos - self.reservados
+
+    async def adquirir(self, prioritaria: bool = False) -> None:
+        if (self.en_curso < self._limite(prioritaria) and not self._prioritarias
+                and (prioritaria or not self._normales)):
+            self.en_curso += 1
+            return
+        cola = self._prioritarias if prioritaria else self._normales
+        futuro = asyncio.get_running_loop().create_future()
+        cola.append(futuro)
+        try:
+            await futuro
+        except asyncio.CancelledError:
+            if futuro.done() and not futuro.cancelled():
+                # El turno ya se le había dado: pasa al siguiente
+                self.liberar()
+            elif futuro in cola:
+                cola.remove(futuro)
+            raise
+
+    def liberar(self) -> None:
+        self.en_curso -= 1
+        for prioritaria, cola in ((True, self._prioritarias), (False, self._normales)):
+            while cola and self.en_curso < self._limite(prioritaria):
+                futuro = cola.popleft()
+                if not futuro.done():
+                    self.en_curso += 1
+                    futuro.set_result(None)
+
+class AsyncDatabaseManager:
+    """Variante asíncrona de DatabaseManager para los routers.
+
+    Las lecturas puntuales se resuelven en el bucle de eventos cuando la caché
+    está al día y en el executor cuando hay que recargar el archivo. Las escrituras se
+    limitan con ``TurnosEscritura`` y se ejecutan en un ThreadPoolExecutor
+    acotado, así una escritura lenta no detiene las peticiones en curso. Sin
+    group commit hay un turno, una escritura a la vez; con group commit hay
+    varios para que compartan lote, dejando siempre un hilo libre para las
+    recargas de lectura. Las ventas usan ``write_prioritaria``: pasan delante
+    de las demás escrituras en espera y tienen un turno reservado.
+    """
+
+    def __init__(self, manager: DatabaseManager, max_workers: int = None):
+        self.manager = manager
+        self.max_workers = max_workers or settings.DB_EXECUTOR_WORKERS
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._write_slots: Optional[TurnosEscritura] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Escrituras esperando turno o en curso; lo usa el control de carga
+        self.escrituras_pendientes = 0
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pos-db")
+        return self._executor
+    
+    def _get_write_slots(self) -> TurnosEscritura:
+        # Los futuros de asyncio pertenecen a un bucle; se recrean si cambia (p. ej. en tests)
+        loop = asyncio.get_running_loop()
+        if self._write_slots is None or self._loop is not loop:
+            slots = max(1, self.max_workers - 1) if self.manager.group_commit_ms > 0 else 1
+            self._write_slots = TurnosEscritura(slots)
+            self._loop = loop
+        return self._write_slots
+    
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Ejecuta una función bloqueante en el executor acotado"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), functools.partial(fn, *args, **kwargs))
+    
+    async def read(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Ejecuta una lectura, sin salir del bucle si la caché está al día.
+
+        Solo para consultas de costo acotado (búsquedas por id o por índice): un
+        listado completo en el bucle detendría todas las peticiones en curso.
+        """
+        if self.manager.is_fresh():
+            return fn(*args, **kwargs)
+        return await self.run(fn, *args, **kwargs)
+    
+    async def _escribir(self, prioritaria: bool, fn: Callable[..., T], *args, **kwargs) -> T:
+        self.escrituras_pendientes += 1
+        try:
+            turnos = self._get_write_slots()
+            await turnos.adquirir(prioritaria)
+            try:
+                return await self.run(fn, *args, **kwargs)
+            finally:
+                turnos.liberar()
+        finally:
+            self.escrituras_pendientes -= 1
+    
+    async def write(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Ejecuta una escritura en el executor"""
+        return await self._escribir(False, fn, *args, **kwargs)
+    
+    async def write_prioritaria(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Ejecuta una escritura que no espera detrás de las que no son prioritarias"""
+        return await self._escribir(True, fn, *args, **kwargs)
+    
+    async def open(self) -> None:
+        """Abre el almacenamiento sin bloquear el bucle de eventos"""
+        await self.run(self.manager.open)
+    
+    def close(self) -> None:
+        """Libera los hilos del executor"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
 
 # Instancia global del gestor de base de datos
-db_manager = DatabaseManager() 
\ No newline at end of file
+db_manager = DatabaseManager()
+async_db_manager = AsyncDatabaseManager(db_manager) 
\ No newline at end of file
@@ -0,0 +1,336 @@
+"""
+Idempotencia de las peticiones POST mediante la cabecera ``Idempotency-Key``.
+
+Una caja que reintenta ``POST /ventas/`` con la misma clave recibe la respuesta
+original en lugar de registrar otra venta. Las respuestas se guardan en una
+caché LRU con vencimiento y también en un archivo aparte junto a la base de
+datos (``<db>.idempotencia``), de modo que siguen valiendo tras reiniciar el
+servidor o si el reintento llega a otro worker. Guardar una respuesta agrega
+una línea a ese archivo: no reescribe la base de datos ni cambia su versión.
+
+- La clave se asocia al método, la ruta y un hash del cuerpo: reutilizarla con
+  otro cuerpo responde 422.
+- Un reintento que llega mientras la petición original sigue en curso espera
+  a que termine y devuelve su misma respuesta, aunque llegue a otro worker:
+  antes de ejecutar la petición se reclama la clave agregando una línea
+  "pendiente" al archivo, y los demás workers consultan el archivo hasta que
+  aparece la respuesta. Si el worker que la reclamó muere, la reclamación
+  vence tras ``IDEMPOTENCIA_PENDIENTE_SEGUNDOS``.
+- Solo se guardan las respuestas < 500; ante un error del servidor la caja
+  puede reintentar y la petición se ejecuta de nuevo.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos, solo un worker
+    fcntl = None
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .database import AsyncDatabaseManager, async_db_manager, sincronizar_directorio
+
+logger = logging.getLogger(__name__)
+
+CABECERA = "Idempotency-Key"
+LARGO_MAXIMO_CLAVE = 255
+# Cada cuánto se consulta el archivo mientras otro worker atiende la misma clave
+INTERVALO_ESPERA_SEGUNDOS = 0.05
+
+class CacheIdempotencia:
+    """Respuestas recientes por clave, con vencimiento y expulsión LRU"""
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def obtener(self, clave: str) -> Optional[Dict[str, Any]]:
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        if entrada["expira"] <= time.time():
+            del self._entradas[clave]
+            return None
+        self._entradas.move_to_end(clave)
+        return entrada
+
+    def guardar(self, entrada: Dict[str, Any]) -> None:
+        self._entradas[entrada["clave"]] = entrada
+        self._entradas.move_to_end(entrada["clave"])
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+class RegistroIdempotencia:
+    """Respuestas guardadas en un archivo de líneas JSON compartido por los workers.
+
+    Cada respuesta se agrega al final del archivo con un bloqueo propio
+    (``<archivo>.lock``), independiente del de la base de datos. Cada proceso
+    lee solo las líneas que agregaron los demás desde su última lectura, y el
+    archivo se reescribe sin las entradas vencidas cuando acumula el doble del
+    máximo configurado. Además de respuestas hay líneas que reclaman una clave
+    (``"pendiente": true``) y que la liberan (``"liberada": true``).
+    """
+
+    def __init__(self, path: str, max_entradas: int):
+        self.path = path
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._entradas: Dict[str, Dict[str, Any]] = {}
+        # Archivo (inodo) y bytes ya incorporados a _entradas
+        self._inodo: Optional[int] = None
+        self._posicion = 0
+        self._lineas = 0
+
+    @contextmanager
+    def _bloqueo(self):
+        with self._lock, open(f"{self.path}.lock", "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _leer_nuevas(self) -> None:
+        """Incorpora las líneas agregadas desde la última lectura"""
+        try:
+            estado = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if estado.st_ino != self._inodo or estado.st_size < self._posicion:
+            # Otro proceso compactó el archivo: se vuelve a leer completo
+            self._entradas, self._inodo, self._posicion, self._lineas = {}, estado.st_ino, 0, 0
+        if estado.st_size == self._posicion:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._posicion)
+            datos = f.read()
+        # Solo líneas completas: la última puede estar escribiéndose todavía
+        fin = datos.rfind(b"\n") + 1
+        for linea in datos[:fin].splitlines():
+            try:
+                entrada = json.loads(linea)
+            except ValueError:
+                continue
+            if entrada.get("liberada"):
+                self._entradas.pop(entrada["clave"], None)
+            else:
+                self._entradas[entrada["clave"]] = entrada
+            self._lineas += 1
+        self._posicion += fin
+
+    def obtener(self, clave: str) -> Optional[Dict[str, Any]]:
+        """Respuesta guardada (o reclamación pendiente) para la clave, si no ha vencido"""
+        with self._lock:
+            self._leer_nuevas()
+            entrada = self._entradas.get(clave)
+        if entrada is None or entrada["expira"] <= time.time():
+            return None
+        return entrada
+
+    def _agregar(self, entrada: Dict[str, Any]) -> None:
+        """Agrega una línea; se llama con el bloqueo tomado y las líneas ajenas ya leídas"""
+        linea = (json.dumps(entrada, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.write(linea)
+            if settings.DB_FSYNC:
+                f.flush()
+                os.fsync(f.fileno())
+        if self._inodo is None:
+            self._inodo = os.stat(self.path).st_ino
+        if entrada.get("liberada"):
+            self._entradas.pop(entrada["clave"], None)
+        else:
+            self._entradas[entrada["clave"]] = entrada
+        self._posicion += len(linea)
+        self._lineas += 1
+        if self._lineas > 2 * self.max_entradas:
+            self._compactar()
+
+    def guardar(self, entrada: Dict[str, Any]) -> None:
+        with self._bloqueo():
+            self._leer_nuevas()
+            self._agregar(entrada)
+
+    def reclamar(self, pendiente: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Reclama la clave para ejecutar la petición en este proceso.
+
+        Devuelve None si se reclamó, o la entrada vigente (respuesta o reclamación
+        de otro proceso) si ya existía.
+        """
+        with self._bloqueo():
+            self._leer_nuevas()
+            actual = self._entradas.get(pendiente["clave"])
+            if actual is not None and actual["expira"] > time.time():
+                return actual
+            self._agregar(pendiente)
+            return None
+
+    def liberar(self, clave: str) -> None:
+        """Retira la reclamación de una petición que no dejó respuesta guardada"""
+        with self._bloqueo():
+            self._leer_nuevas()
+            self._agregar({"clave": clave, "liberada": True})
+
+    def _compactar(self) -> None:
+        """Reescribe el archivo con las entradas vigentes más recientes"""
+        ahora = time.time()
+        vigentes = [e for e in self._entradas.values() if e["expira"] > ahora][-self.max_entradas:]
+        contenido = "".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n" for e in vigentes)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(contenido)
+            if settings.DB_FSYNC:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        if settings.DB_FSYNC:
+            sincronizar_directorio(self.path)
+        estado = os.stat(self.path)
+        self._entradas = {e["clave"]: e for e in vigentes}
+        self._inodo, self._posicion, self._lineas = estado.st_ino, estado.st_size, len(vigentes)
+
+def respuesta_guardada(entrada: Dict[str, Any]) -> Response:
+    """Reconstruye la respuesta original marcándola como repetida"""
+    return Response(
+        content=entrada["cuerpo"],
+        status_code=entrada["status"],
+        media_type=entrada["media_type"],
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+class IdempotenciaMiddleware:
+    """Middleware ASGI puro: las peticiones sin clave pasan sin ningún costo añadido"""
+
+    def __init__(self, app: ASGIApp, db: Optional[AsyncDatabaseManager] = None,
+                 ttl_segundos: Optional[float] = None, max_entradas: Optional[int] = None):
+        self.app = app
+        self.db = db or async_db_manager
+        self.ttl_segundos = settings.IDEMPOTENCIA_TTL_SEGUNDOS if ttl_segundos is None else ttl_segundos
+        self.pendiente_segundos = settings.IDEMPOTENCIA_PENDIENTE_SEGUNDOS
+        self.cache = CacheIdempotencia(settings.IDEMPOTENCIA_MAX_ENTRADAS if max_entradas is None else max_entradas)
+        self.registro = RegistroIdempotencia(f"{self.db.manager.db_file}.idempotencia", self.cache.max_entradas)
+        # Peticiones con clave todavía en curso en este proceso
+        self._en_curso: Dict[str, asyncio.Future] = {}
+
+    async def _buscar(self, clave: str) -> Optional[Dict[str, Any]]:
+        entrada = self.cache.obtener(clave)
+        if entrada is None:
+            entrada = await self.db.run(self.registro.obtener, clave)
+            if entrada is not None and not entrada.get("pendiente"):
+                self.cache.guardar(entrada)
+        return entrada
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        clave_cliente = Headers(scope=scope).get(CABECERA)
+        if not clave_cliente:
+            return await self.app(scope, receive, send)
+        if len(clave_cliente) > LARGO_MAXIMO_CLAVE:
+            return await JSONResponse({"detail": f"{CABECERA} demasiado larga"}, status_code=400)(scope, receive, send)
+
+        # Se lee el cuerpo completo para calcular su hash y luego se entrega igual a la aplicación
+        cuerpo = b""
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "http.disconnect":
+                return
+            cuerpo += mensaje.get("body", b"")
+            if not mensaje.get("more_body", False):
+                break
+        entregado = False
+
+        async def recibir() -> Message:
+            nonlocal entregado
+            if entregado:
+                return await receive()
+            entregado = True
+            return {"type": "http.request", "body": cuerpo, "more_body": False}
+
+        clave = f"{scope['method']} {scope['path']} {clave_cliente}"
+        huella = hashlib.sha256(cuerpo).hexdigest()
+        while True:
+            entrada = await self._buscar(clave)
+            if entrada is not None and entrada["huella"] != huella:
+                respuesta = JSONResponse(
+                    {"detail": f"{CABECERA} ya usada con otro cuerpo de petición"}, status_code=422
+                )
+                return await respuesta(scope, recibir, send)
+            if entrada is not None and not entrada.get("pendiente"):
+                return await respuesta_guardada(entrada)(scope, recibir, send)
+            original = self._en_curso.get(clave)
+            if original is not None:
+                await asyncio.shield(original)
+                continue
+            if entrada is not None:
+                # La petición original sigue en curso en otro worker
+                await asyncio.sleep(INTERVALO_ESPERA_SEGUNDOS)
+                continue
+            self._en_curso[clave] = asyncio.get_running_loop().create_future()
+            pendiente = {"clave": clave, "huella": huella, "pendiente": True,
+                         "expira": time.time() + self.pendiente_segundos}
+            try:
+                reclamada = await self.db.run(self.registro.reclamar, pendiente) is None
+            except BaseException:
+                self._en_curso.pop(clave).set_result(None)
+                raise
+            if reclamada:
+                break
+            # Otro worker la reclamó justo antes: se vuelve a consultar
+            self._en_curso.pop(clave).set_result(None)
+
+        guardada = False
+        try:
+            inicio: Message = {}
+            partes = []
+
+            async def capturar(mensaje: Message) -> None:
+                if mensaje["type"] == "http.response.start":
+                    inicio.update(mensaje)
+                elif mensaje["type"] == "http.response.body":
+                    partes.append(mensaje.get("body", b""))
+
+            await self.app(scope, recibir, capturar)
+            respuesta = b"".join(partes)
+            if inicio["status"] < 500:
+                entrada = {
+                    "clave": clave,
+                    "huella": huella,
+                    "status": inicio["status"],
+                    "media_type": Headers(raw=inicio["headers"]).get("content-type"),
+                    "cuerpo": respuesta.decode("utf-8"),
+                    "expira": time.time() + self.ttl_segundos,
+                }
+                self.cache.guardar(entrada)
+                guardada = True
+                try:
+                    # Solo agrega una línea al archivo de respuestas: no espera turno de escritura
+                    await self.db.run(self.registro.guardar, entrada)
+                except Exception:
+                    # La operación ya se realizó: se responde igual y la clave queda solo en
+                    # memoria; en los demás workers la reclamación la protege hasta que vence
+                    logger.exception("No se pudo persistir la respuesta de %s", clave)
+            await send(inicio)
+            await send({"type": "http.response.body", "body": respuesta, "more_body": False})
+        finally:
+            if not guardada:
+                # Error del servidor: la caja puede reintentar y la petición se ejecuta de nuevo
+                try:
+                    await self.db.run(self.registro.liberar, clave)
+                except Exception:
+                    logger.exception("No se pudo liberar la clave %s", clave)
+            self._en_curso.pop(clave).set_result(None)
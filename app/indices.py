@@ -0,0 +1,547 @@
+import bisect
+import heapq
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from operator import itemgetter
+from typing import Dict, List, Any, Optional, Tuple, Iterable, Callable
+
+from .config import settings
+from .inventario import EventoStock, IndiceInventario
+from .reportes_paralelos import Cache, ventas_nuevas
+from .utils import normalize_email, phone_digits, uuid7_timestamp
+
+# Tipos de cambio que registran las escrituras; se aplican a los índices con
+# ``Indices.aplicar`` una vez que la escritura está en disco
+PRODUCTO = "producto"
+CLIENTE = "cliente"
+VENTA = "venta"
+Cambio = Tuple[Any, ...]
+
+def venta_timestamp(venta: Dict[str, Any]) -> float:
+    """Convierte la fecha ISO de una venta a segundos desde epoch"""
+    return datetime.fromisoformat(venta["fecha"]).timestamp()
+
+def clave_temporal(venta: Dict[str, Any]) -> float:
+    """Momento de la venta: del id si es UUIDv7, si no de su fecha (ventas con UUIDv4)"""
+    ts = uuid7_timestamp(venta["id"])
+    return venta_timestamp(venta) if ts is None else ts
+
+def archivado(registro: Optional[Dict[str, Any]]) -> bool:
+    """Indica si un registro fue dado de baja lógica (se conserva por tener ventas)"""
+    return bool(registro and registro.get("archivado"))
+
+def top_k(conteos: Dict[str, int], k: int, incluir: Callable[[str], bool] = None) -> List[Tuple[str, int]]:
+    """Selecciona los k mayores conteos con un heap acotado: O(n log k)"""
+    candidatos = conteos.items() if incluir is None else ((pid, c) for pid, c in conteos.items() if incluir(pid))
+    return heapq.nlargest(k, candidatos, key=itemgetter(1))
+
+class ContadorPopulares:
+    """Unidades vendidas por producto desde el inicio, agrupadas también por categoría"""
+
+    def __init__(self):
+        self.vendidos: Dict[str, int] = {}
+        self.por_categoria: Dict[str, Dict[str, int]] = {}
+        self._categoria_de: Dict[str, str] = {}
+
+    def agregar(self, producto_id: str, cantidad: int) -> None:
+        self.vendidos[producto_id] = self.vendidos.get(producto_id, 0) + cantidad
+        categoria = self._categoria_de.get(producto_id)
+        if categoria is not None:
+            bucket = self.por_categoria.setdefault(categoria, {})
+            bucket[producto_id] = self.vendidos[producto_id]
+
+    def cambiar_categoria(self, producto_id: str, categoria: Optional[str]) -> None:
+        """Mueve el conteo de un producto cuando cambia (o desaparece) su categoría"""
+        anterior = self._categoria_de.get(producto_id)
+        if anterior == categoria:
+            return
+        if anterior is not None:
+            bucket = self.por_categoria.get(anterior, {})
+            bucket.pop(producto_id, None)
+            if not bucket:
+                self.por_categoria.pop(anterior, None)
+            del self._categoria_de[producto_id]
+        if categoria is not None:
+            self._categoria_de[producto_id] = categoria
+            if producto_id in self.vendidos:
+                self.por_categoria.setdefault(categoria, {})[producto_id] = self.vendidos[producto_id]
+
+    def top(self, k: int, categoria: Optional[str] = None) -> List[Tuple[str, int]]:
+        conteos = self.vendidos if categoria is None else self.por_categoria.get(categoria, {})
+        return top_k(conteos, k)
+
+class VentanaDeslizante:
+    """Unidades vendidas por producto en los últimos ``minutos``.
+
+    Guarda los eventos en orden de llegada y descuenta los que salen de la
+    ventana al avanzar el tiempo, sin volver a recorrer el historial.
+    """
+
+    def __init__(self, minutos: int):
+        self.segundos = minutos * 60
+        self.eventos: deque = deque()
+        self.conteos: Dict[str, int] = {}
+
+    def agregar(self, ts: float, producto_id: str, cantidad: int) -> None:
+        self.eventos.append((ts, producto_id, cantidad))
+        self.conteos[producto_id] = self.conteos.get(producto_id, 0) + cantidad
+
+    def expirar(self, ahora: float) -> None:
+        limite = ahora - self.segundos
+        while self.eventos and self.eventos[0][0] <= limite:
+            _, producto_id, cantidad = self.eventos.popleft()
+            restante = self.conteos[producto_id] - cantidad
+            if restante:
+                self.conteos[producto_id] = restante
+            else:
+                del self.conteos[producto_id]
+
+    def top(self, k: int, ahora: float, incluir: Callable[[str], bool] = None) -> List[Tuple[str, int]]:
+        self.expirar(ahora)
+        return top_k(self.conteos, k, incluir)
+
+class IndiceUnico:
+    """Índice clave normalizada -> id de registro para un campo que no admite duplicados"""
+
+    def __init__(self, campo: str, normalizar: Callable[[str], str]):
+        self.campo = campo
+        self.normalizar = normalizar
+        self.ids: Dict[str, str] = {}
+
+    def clave(self, registro: Dict[str, Any]) -> str:
+        return self.normalizar(registro.get(self.campo) or "")
+
+    def buscar(self, valor: str) -> Optional[str]:
+        return self.ids.get(self.normalizar(valor))
+
+    def conflicto(self, registro: Dict[str, Any]) -> Optional[str]:
+        """Id de otro registro que ya usa el mismo valor, si lo hay"""
+        clave = self.clave(registro)
+        existente = self.ids.get(clave) if clave else None
+        return existente if existente != registro.get("id") else None
+
+    def cambiar(self, anterior: Optional[Dict[str, Any]], nuevo: Optional[Dict[str, Any]]) -> None:
+        if anterior is not None and self.ids.get(self.clave(anterior)) == anterior["id"]:
+            del self.ids[self.clave(anterior)]
+        if nuevo is not None and self.clave(nuevo):
+            # Con datos previos duplicados se conserva el primer registro
+            self.ids.setdefault(self.clave(nuevo), nuevo["id"])
+
+class IndiceReferencias:
+    """Índice inverso clave -> ids de las ventas que la referencian, en orden de alta"""
+
+    def __init__(self):
+        self.ventas: Dict[str, List[str]] = {}
+
+    def agregar(self, clave: str, venta_id: str) -> None:
+        ids = self.ventas.setdefault(clave, [])
+        if not ids or ids[-1] != venta_id:
+            ids.append(venta_id)
+
+    def contar(self, clave: str) -> int:
+        return len(self.ventas.get(clave, ()))
+
+    def ids(self, clave: str) -> List[str]:
+        return list(self.ventas.get(clave, ()))
+
+def productos_de_venta(venta: Dict[str, Any]) -> List[str]:
+    """Ids de producto distintos de una venta, en orden de aparición"""
+    return list(dict.fromkeys(item["producto_id"] for item in venta["items"]))
+
+def contar_pares(canastas: List[List[str]]) -> Dict[Tuple[str, str], int]:
+    """Cuenta los pares (a, b) con a < b que aparecen juntos en cada canasta"""
+    pares: Dict[Tuple[str, str], int] = {}
+    for canasta in canastas:
+        canasta = sorted(canasta)
+        for i, a in enumerate(canasta):
+            for b in canasta[i + 1:]:
+                pares[(a, b)] = pares.get((a, b), 0) + 1
+    return pares
+
+def contar_pares_en_paralelo(canastas: List[List[str]], procesos: int) -> Dict[Tuple[str, str], int]:
+    """Reparte las canastas entre procesos y combina los conteos parciales"""
+    # Importación diferida: solo se necesita en reconstrucciones grandes
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    tamano = -(-len(canastas) // procesos)
+    bloques = [canastas[i:i + tamano] for i in range(0, len(canastas), tamano)]
+    total: Dict[Tuple[str, str], int] = {}
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+        for parcial in pool.map(contar_pares, bloques):
+            for par, veces in parcial.items():
+                total[par] = total.get(par, 0) + veces
+    return total
+
+class Coocurrencias:
+    """Conteo disperso de productos comprados juntos ("frecuentemente comprados juntos").
+
+    Para acotar la memoria cada producto guarda como máximo ``capacidad``
+    compañeros; al superarla se recorta a la mitad conservando los más
+    frecuentes. Así la consulta de los k relacionados cuesta O(capacidad) = O(k).
+    """
+
+    def __init__(self, top_k: int):
+        self.top_k = top_k
+        self.capacidad = 4 * top_k
+        self.pares: Dict[str, Dict[str, int]] = {}
+
+    def _sumar(self, a: str, b: str, veces: int) -> None:
+        companeros = self.pares.setdefault(a, {})
+        companeros[b] = companeros.get(b, 0) + veces
+        if len(companeros) > self.capacidad:
+            self.pares[a] = dict(top_k(companeros, self.capacidad // 2))
+
+    def agregar_canasta(self, canasta: List[str]) -> None:
+        for i, a in enumerate(canasta):
+            for b in canasta[i + 1:]:
+                self._sumar(a, b, 1)
+                self._sumar(b, a, 1)
+
+    def cargar(self, conteos: Dict[Tuple[str, str], int]) -> None:
+        """Carga conteos exactos de pares y recorta cada producto a sus mejores compañeros"""
+        completos: Dict[str, Dict[str, int]] = {}
+        for (a, b), veces in conteos.items():
+            completos.setdefault(a, {})[b] = veces
+            completos.setdefault(b, {})[a] = veces
+        self.pares = {
+            producto_id: dict(top_k(companeros, self.capacidad)) if len(companeros) > self.capacidad else companeros
+            for producto_id, companeros in completos.items()
+        }
+
+    def relacionados(self, producto_id: str, k: int, incluir: Callable[[str], bool] = None) -> List[Tuple[str, int]]:
+        return top_k(self.pares.get(producto_id, {}), k, incluir)
+
+class EstadisticasCliente:
+    """Acumulados de compra de un cliente, actualizados con cada venta"""
+    __slots__ = ("ultima_compra", "ultima_fecha", "pedidos", "gasto_total")
+
+    def __init__(self):
+        self.ultima_compra = 0.0
+        self.ultima_fecha = ""
+        self.pedidos = 0
+        self.gasto_total = 0.0
+
+    def agregar(self, ts: float, fecha: str, total: float) -> None:
+        if ts >= self.ultima_compra:
+            self.ultima_compra, self.ultima_fecha = ts, fecha
+        self.pedidos += 1
+        self.gasto_total += total
+
+def puntuacion_quintil(ordenados: List[float], valor: float) -> int:
+    """Puntuación 1-5 según el quintil de ``valor`` dentro de la lista ordenada.
+
+    Los empates usan el rango medio, así un valor compartido por todos queda en 3.
+    """
+    rango_medio = (bisect.bisect_left(ordenados, valor) + bisect.bisect_right(ordenados, valor)) / 2
+    return 1 + min(4, int(rango_medio * 5 / len(ordenados)))
+
+SEGMENTOS_RFM = ("campeones", "leales", "nuevos", "en_riesgo", "perdidos", "ocasionales")
+
+def segmento_rfm(r: int, f: int, m: int) -> str:
+    """Segmento de marketing a partir de las puntuaciones de recencia, frecuencia y monto"""
+    if r >= 4 and f >= 4 and m >= 4:
+        return "campeones"
+    if r >= 3 and f >= 3:
+        return "leales"
+    if r >= 4:
+        return "nuevos"
+    if f >= 3:
+        return "en_riesgo"
+    if r <= 2:
+        return "perdidos"
+    return "ocasionales"
+
+class Indices:
+    """Estructuras derivadas de la base de datos que se mantienen en memoria.
+
+    Se reconstruyen cuando se carga el archivo y se actualizan de forma
+    incremental en cada escritura local, de modo que las consultas no recorren
+    las colecciones completas. Todas las operaciones toman ``lock``.
+    """
+
+    def __init__(self, ventanas_minutos: Iterable[int] = None):
+        self.lock = threading.RLock()
+        self.ventanas_minutos = sorted(ventanas_minutos or settings.POPULARES_VENTANAS_MINUTOS)
+        self.inventario = IndiceInventario()
+        self.reconstruir({"productos": [], "clientes": [], "ventas": []})
+
+    def reconstruir(self, data: Dict[str, List[Any]]) -> None:
+        with self.lock:
+            ventas_previas = getattr(self, "ventas", {})
+            coocurrencias_previas = getattr(self, "coocurrencias", None)
+            self.productos: Dict[str, Dict[str, Any]] = {}
+            self.clientes: Dict[str, Dict[str, Any]] = {}
+            self.clientes_por_email = IndiceUnico("email", normalize_email)
+            self.clientes_por_telefono = IndiceUnico("telefono", phone_digits)
+            self.ventas: Dict[str, Dict[str, Any]] = {}
+            self.ventas_por_producto = IndiceReferencias()
+            self.ventas_por_cliente = IndiceReferencias()
+            # Particiones del historial por mes (YYYY-MM) para los reportes paralelos
+            self.ventas_por_mes: Dict[str, List[Dict[str, Any]]] = {}
+            self.archivados = {"productos": 0, "clientes": 0}
+            self.estadisticas_clientes: Dict[str, EstadisticasCliente] = {}
+            self.populares = ContadorPopulares()
+            self.ventanas = {m: VentanaDeslizante(m) for m in self.ventanas_minutos}
+            self.inventario.limpiar()
+            # Al recargar se descartan los eventos: ya los emitió el proceso que hizo el cambio
+            for producto in data["productos"]:
+                self.producto_cambiado(None, producto)
+            for cliente in data["clientes"]:
+                self.cliente_cambiado(None, cliente)
+            for venta in data["ventas"]:
+                self._indexar_venta(venta)
+            self._reconstruir_orden(data["ventas"])
+            self._reconstruir_ventanas(data["ventas"])
+            self._conservar_coocurrencias(coocurrencias_previas, ventas_previas, data["ventas"])
+
+    def _reconstruir_orden(self, ventas: List[Dict[str, Any]]) -> None:
+        """Secuencia de ventas ordenada por momento para las consultas por rango"""
+        self.claves_ventas = [clave_temporal(venta) for venta in ventas]
+        self.ventas_en_orden = list(ventas)
+        # Si el historial ya está en orden, la secuencia coincide posición a posición con
+        # data["ventas"] y las ventas nuevas se insertan en el mismo lugar de ambas
+        self.orden_coincide = all(a <= b for a, b in zip(self.claves_ventas, self.claves_ventas[1:]))
+        if not self.orden_coincide:
+            orden = sorted(range(len(ventas)), key=self.claves_ventas.__getitem__)
+            self.claves_ventas = [self.claves_ventas[i] for i in orden]
+            self.ventas_en_orden = [ventas[i] for i in orden]
+
+    def _conservar_coocurrencias(self, previas: Optional[Coocurrencias], ventas_previas: Dict[str, Any],
+                                 ventas: List[Dict[str, Any]]) -> None:
+        """Mantiene los conteos de pares entre recargas sumando solo las ventas nuevas.
+
+        Las ventas no se modifican ni se eliminan, así que si el historial recargado
+        contiene al anterior basta con agregar las canastas que faltan. En la primera
+        carga, o si el historial fue reemplazado, el conteo completo queda pendiente
+        para ``preparar_coocurrencias``: no se hace dentro de una recarga.
+        """
+        nuevas = [venta for venta in ventas if venta["id"] not in ventas_previas]
+        if not ventas:
+            self.coocurrencias = Coocurrencias(settings.RELACIONADOS_TOP_K)
+        elif previas is None or len(ventas) - len(nuevas) != len(ventas_previas):
+            self.coocurrencias = None
+        else:
+            self.coocurrencias = previas
+            for venta in nuevas:
+                previas.agregar_canasta(productos_de_venta(venta))
+
+    def preparar_coocurrencias(self, procesos: int = 1) -> None:
+        """Cuenta los pares de todo el historial, en varios procesos si es grande.
+
+        Es un paso explícito: ``DatabaseManager.open`` lo ejecuta al arrancar con
+        COOCURRENCIA_PROCESOS y, si aún falta, la primera consulta lo hace en un
+        solo proceso.
+        """
+        with self.lock:
+            canastas = [canasta for canasta in map(productos_de_venta, self.ventas_en_orden) if len(canasta) > 1]
+            if procesos > 1 and len(canastas) >= settings.COOCURRENCIA_UMBRAL_PARALELO:
+                conteos = contar_pares_en_paralelo(canastas, procesos)
+            else:
+                conteos = contar_pares(canastas)
+            coocurrencias = Coocurrencias(settings.RELACIONADOS_TOP_K)
+            coocurrencias.cargar(conteos)
+            self.coocurrencias = coocurrencias
+
+    def _reconstruir_ventanas(self, ventas: List[Dict[str, Any]]) -> None:
+        """Carga solo las ventas recientes, recorriendo el historial desde el final"""
+        if not self.ventanas:
+            return
+        limite = time.time() - max(self.ventanas_minutos) * 60
+        recientes = []
+        for venta in reversed(ventas):
+            ts = venta_timestamp(venta)
+            if ts <= limite:
+                break
+            recientes.append((ts, venta))
+        for ts, venta in reversed(recientes):
+            self._agregar_a_ventanas(ts, venta)
+
+    def _agregar_a_ventanas(self, ts: float, venta: Dict[str, Any]) -> None:
+        for ventana in self.ventanas.values():
+            for item in venta["items"]:
+                ventana.agregar(ts, item["producto_id"], item["cantidad"])
+
+    def producto_cambiado(self, anterior: Optional[Dict[str, Any]],
+                          nuevo: Optional[Dict[str, Any]]) -> List[EventoStock]:
+        """Registra el alta (anterior None), modificación o baja (nuevo None) de un producto
+        y devuelve los eventos de inventario que produce"""
+        with self.lock:
+            # Un producto archivado deja de contar para el inventario
+            eventos = self.inventario.actualizar(None if archivado(anterior) else anterior,
+                                                 None if archivado(nuevo) else nuevo)
+            self.archivados["productos"] += archivado(nuevo) - archivado(anterior)
+            if nuevo is None:
+                self.productos.pop(anterior["id"], None)
+                self.populares.cambiar_categoria(anterior["id"], None)
+            else:
+                self.productos[nuevo["id"]] = nuevo
+                self.populares.cambiar_categoria(nuevo["id"], nuevo.get("categoria"))
+            return eventos
+
+    def cliente_cambiado(self, anterior: Optional[Dict[str, Any]], nuevo: Optional[Dict[str, Any]]) -> None:
+        """Registra el alta (anterior None), modificación o baja (nuevo None) de un cliente"""
+        with self.lock:
+            # Un cliente archivado libera su email y teléfono
+            activo_anterior = None if archivado(anterior) else anterior
+            activo_nuevo = None if archivado(nuevo) else nuevo
+            self.clientes_por_email.cambiar(activo_anterior, activo_nuevo)
+            self.clientes_por_telefono.cambiar(activo_anterior, activo_nuevo)
+            self.archivados["clientes"] += archivado(nuevo) - archivado(anterior)
+            if nuevo is None:
+                self.clientes.pop(anterior["id"], None)
+            else:
+                self.clientes[nuevo["id"]] = nuevo
+
+    def cliente_duplicado(self, cliente: Dict[str, Any],
+                          pendientes: Optional[Dict[str, Optional[Dict[str, Any]]]] = None) -> Optional[str]:
+        """Nombre del campo único (email o telefono) que ya usa otro cliente.
+
+        ``pendientes`` son los clientes (por id, None si se eliminó) de escrituras
+        todavía sin persistir: sus valores reemplazan a los del índice.
+        """
+        pendientes = pendientes or {}
+        with self.lock:
+            for indice in (self.clientes_por_email, self.clientes_por_telefono):
+                existente = indice.conflicto(cliente)
+                if existente is not None and existente not in pendientes:
+                    return indice.campo
+                clave = indice.clave(cliente)
+                if clave and any(
+                    otro is not None and not archivado(otro) and otro["id"] != cliente.get("id")
+                    and indice.clave(otro) == clave
+                    for otro in pendientes.values()
+                ):
+                    return indice.campo
+            return None
+
+    def buscar_cliente(self, email: Optional[str] = None, telefono: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            cliente_id = None
+            if email:
+                cliente_id = self.clientes_por_email.buscar(email)
+            if cliente_id is None and telefono and phone_digits(telefono):
+                cliente_id = self.clientes_por_telefono.buscar(telefono)
+            return self.clientes.get(cliente_id) if cliente_id else None
+
+    def _indexar_venta(self, venta: Dict[str, Any]) -> None:
+        self.ventas[venta["id"]] = venta
+        self.ventas_por_cliente.agregar(venta["cliente_id"], venta["id"])
+        self.ventas_por_mes.setdefault(venta["fecha"][:7], []).append(venta)
+        estadisticas = self.estadisticas_clientes.get(venta["cliente_id"])
+        if estadisticas is None:
+            estadisticas = self.estadisticas_clientes[venta["cliente_id"]] = EstadisticasCliente()
+        estadisticas.agregar(venta_timestamp(venta), venta["fecha"], venta["total"])
+        for item in venta["items"]:
+            self.ventas_por_producto.agregar(item["producto_id"], venta["id"])
+            self.populares.agregar(item["producto_id"], item["cantidad"])
+
+    def venta_agregada(self, venta: Dict[str, Any]) -> None:
+        """Indexa una venta nueva, ubicándola en la secuencia ordenada por momento"""
+        with self.lock:
+            self._indexar_venta(venta)
+            self._agregar_a_ventanas(venta_timestamp(venta), venta)
+            if self.coocurrencias is not None:
+                self.coocurrencias.agregar_canasta(productos_de_venta(venta))
+            clave = clave_temporal(venta)
+            posicion = len(self.claves_ventas)
+            if self.claves_ventas and clave < self.claves_ventas[-1]:
+                # Solo ocurre con ids generados en otro worker un instante antes
+                posicion = bisect.bisect_right(self.claves_ventas, clave)
+            self.claves_ventas.insert(posicion, clave)
+            self.ventas_en_orden.insert(posicion, venta)
+
+    def aplicar(self, cambios: Iterable[Cambio]) -> List[EventoStock]:
+        """Aplica en orden los cambios de escrituras ya persistidas y devuelve los
+        eventos de inventario, que el llamador emite fuera de los bloqueos"""
+        eventos: List[EventoStock] = []
+        with self.lock:
+            for tipo, *args in cambios:
+                if tipo == PRODUCTO:
+                    eventos.extend(self.producto_cambiado(*args))
+                elif tipo == CLIENTE:
+                    self.cliente_cambiado(*args)
+                else:
+                    self.venta_agregada(*args)
+        return eventos
+
+    def ventas_entre(self, desde: Optional[float] = None, hasta: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Ventas con momento entre ``desde`` y ``hasta`` (segundos, inclusive) por búsqueda binaria.
+
+        Los UUIDv7 tienen resolución de milisegundos, así que ``desde`` se redondea
+        hacia abajo al milisegundo para incluir la venta cuya fecha se pidió.
+        """
+        with self.lock:
+            desde = None if desde is None else math.floor(desde * 1000) / 1000
+            inicio = 0 if desde is None else bisect.bisect_left(self.claves_ventas, desde)
+            fin = len(self.claves_ventas) if hasta is None else bisect.bisect_right(self.claves_ventas, hasta)
+            return self.ventas_en_orden[inicio:fin]
+
+    def relacionados(self, producto_id: str, limit: int) -> List[Tuple[Dict[str, Any], int]]:
+        """Productos activos comprados junto a ``producto_id`` y cuántas veces"""
+        with self.lock:
+            if self.coocurrencias is None:
+                self.preparar_coocurrencias()
+            activos = lambda pid: pid in self.productos and not archivado(self.productos[pid])
+            return [(self.productos[pid], veces)
+                    for pid, veces in self.coocurrencias.relacionados(producto_id, limit, activos)]
+
+    def ventas_de_cliente(self, cliente_id: str) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [self.ventas[venta_id] for venta_id in self.ventas_por_cliente.ids(cliente_id)]
+
+    def particiones_por_mes(self, desde: Optional[str] = None, hasta: Optional[str] = None,
+                            cache: Optional[Cache] = None) -> Dict[str, Tuple[int, List[Dict[str, Any]]]]:
+        """Ventas de cada mes entre ``desde`` y ``hasta`` (YYYY-MM, inclusive) que
+        ``cache`` todavía no cubre, ver ``ventas_nuevas``"""
+        with self.lock:
+            meses = {
+                mes: ventas for mes, ventas in self.ventas_por_mes.items()
+                if (desde is None or mes >= desde) and (hasta is None or mes <= hasta)
+            }
+            return ventas_nuevas(meses, cache or {})
+
+    def rfm_clientes(self) -> List[Tuple[str, EstadisticasCliente, int, int, int, str]]:
+        """Puntuaciones RFM (cliente_id, estadísticas, r, f, m, segmento) de los clientes
+        activos con compras; los archivados quedan fuera, igual que en el listado de clientes.
+
+        Usa los acumulados por cliente, así que el costo es O(C log C) sobre los
+        clientes y no depende del tamaño del historial de ventas.
+        """
+        with self.lock:
+            items = [
+                (cliente_id, e) for cliente_id, e in self.estadisticas_clientes.items()
+                if cliente_id in self.clientes and not archivado(self.clientes[cliente_id])
+            ]
+        if not items:
+            return []
+        recencias = sorted(e.ultima_compra for _, e in items)
+        frecuencias = sorted(e.pedidos for _, e in items)
+        montos = sorted(e.gasto_total for _, e in items)
+        resultado = []
+        for cliente_id, e in items:
+            r = puntuacion_quintil(recencias, e.ultima_compra)
+            f = puntuacion_quintil(frecuencias, e.pedidos)
+            m = puntuacion_quintil(montos, e.gasto_total)
+            resultado.append((cliente_id, e, r, f, m, segmento_rfm(r, f, m)))
+        return resultado
+
+    def bajo_stock(self, limit: Optional[int] = None) -> List[Tuple[Dict[str, Any], int]]:
+        """Productos con stock bajo y su umbral, más urgentes primero"""
+        with self.lock:
+            return [(self.productos[pid], umbral) for pid, _, umbral in self.inventario.bajo_stock(limit)]
+
+    def top_productos(self, limit: int, categoria: Optional[str] = None,
+                      ventana_minutos: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Productos más vendidos (id, cantidad), opcionalmente por categoría y ventana"""
+        with self.lock:
+            if ventana_minutos is None:
+                return self.populares.top(limit, categoria)
+            incluir = None
+            if categoria is not None:
+                incluir = lambda pid: self.productos.get(pid, {}).get("categoria") == categoria
+            return self.ventanas[ventana_minutos].top(limit, time.time(), incluir)
@@ -0,0 +1,86 @@
+"""
+Verificación de integridad referencial de la base de datos.
+
+Recorre el almacén una sola vez: primero indexa los ids de productos y
+clientes y después revisa cada venta contra esos índices. El archivo solo se
+lee: no se crea, no se repara y no se tocan sus archivos de bloqueo o versión.
+
+Uso: python -m app.integridad [--db pos_database.json]
+Sale con 1 si hay problemas y con 2 si el archivo no existe o no se puede leer.
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Any
+
+COLECCIONES = ("productos", "clientes", "ventas")
+
+def verificar_integridad(data: Dict[str, List[Any]]) -> Dict[str, Any]:
+    """Devuelve un resumen con los problemas encontrados en una sola pasada"""
+    problemas: List[str] = []
+
+    productos = set()
+    for producto in data["productos"]:
+        if producto["id"] in productos:
+            problemas.append(f"Producto duplicado: {producto['id']}")
+        productos.add(producto["id"])
+        if producto["stock"] < 0:
+            problemas.append(f"Producto {producto['id']} con stock negativo ({producto['stock']})")
+
+    clientes = set()
+    for cliente in data["clientes"]:
+        if cliente["id"] in clientes:
+            problemas.append(f"Cliente duplicado: {cliente['id']}")
+        clientes.add(cliente["id"])
+
+    ventas = set()
+    for venta in data["ventas"]:
+        if venta["id"] in ventas:
+            problemas.append(f"Venta duplicada: {venta['id']}")
+        ventas.add(venta["id"])
+        if venta["cliente_id"] not in clientes:
+            problemas.append(f"Venta {venta['id']} referencia al cliente inexistente {venta['cliente_id']}")
+        for item in venta["items"]:
+            if item["producto_id"] not in productos:
+                problemas.append(f"Venta {venta['id']} referencia al producto inexistente {item['producto_id']}")
+
+    return {
+        "productos": len(productos),
+        "clientes": len(clientes),
+        "ventas": len(ventas),
+        "problemas": problemas,
+    }
+
+def cargar(path: str) -> Dict[str, List[Any]]:
+    """Lee el archivo tal cual, sin crearlo ni repararlo (a diferencia de DatabaseManager)"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or any(not isinstance(data.get(c), list) for c in COLECCIONES):
+        raise ValueError(f"se esperaban las colecciones {', '.join(COLECCIONES)}")
+    return data
+
+def main() -> None:
+    from .config import settings
+
+    parser = argparse.ArgumentParser(description="Verifica la integridad referencial de la base de datos")
+    parser.add_argument("--db", help="Archivo de base de datos (por defecto DATABASE_FILE)")
+    args = parser.parse_args()
+    path = args.db or settings.get_database_url()
+
+    try:
+        data = cargar(path)
+    except (OSError, ValueError) as exc:
+        print(f"No se pudo leer {path}: {exc}", file=sys.stderr)
+        sys.exit(2)
+    resultado = verificar_integridad(data)
+    print(f"Productos: {resultado['productos']}  Clientes: {resultado['clientes']}  Ventas: {resultado['ventas']}")
+    for problema in resultado["problemas"]:
+        print(f"  - {problema}")
+    if resultado["problemas"]:
+        print(f"{len(resultado['problemas'])} problemas encontrados")
+        sys.exit(1)
+    print("Sin problemas de integridad")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import heapq
+import logging
+from typing import Dict, List, Any, Optional, Callable, NamedTuple, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tipos de evento emitidos al cruzar un umbral
+BAJO_STOCK = "bajo_stock"
+AGOTADO = "agotado"
+STOCK_NEGATIVO = "stock_negativo"
+REPUESTO = "repuesto"
+
+class EventoStock(NamedTuple):
+    tipo: str
+    producto_id: str
+    stock: int
+    stock_minimo: int
+
+def stock_minimo_de(producto: Dict[str, Any]) -> int:
+    """Umbral de reposición del producto, o el valor por defecto de la configuración"""
+    umbral = producto.get("stock_minimo")
+    return settings.STOCK_MINIMO_DEFAULT if umbral is None else umbral
+
+def registrar_evento(evento: EventoStock) -> None:
+    """Suscriptor por defecto: deja constancia de la alerta en el log"""
+    logger.warning("Inventario: %s en producto %s (stock %s, mínimo %s)", *evento)
+
+class IndiceInventario:
+    """Productos en o por debajo de su umbral de reposición.
+
+    Solo guarda los productos con stock bajo, junto a un heap ordenado por
+    ``stock - stock_minimo`` (los más urgentes primero). Las entradas del heap que
+    quedan obsoletas se descartan al consultar y se compactan cuando superan a
+    las válidas. Cada cambio de stock cuesta O(log k) y no recorre el catálogo.
+    """
+
+    def __init__(self):
+        self.suscriptores: List[Callable[[EventoStock], None]] = [registrar_evento]
+        self.limpiar()
+
+    def limpiar(self) -> None:
+        # producto_id -> (stock, stock_minimo, secuencia de la entrada vigente en el heap)
+        self.bajos: Dict[str, Tuple[int, int, int]] = {}
+        self._heap: List[Tuple[int, int, str]] = []
+        self._secuencia = 0
+
+    def suscribir(self, callback: Callable[[EventoStock], None]) -> None:
+        self.suscriptores.append(callback)
+
+    def emitir(self, eventos: List[EventoStock]) -> None:
+        """Entrega los eventos a los suscriptores; un suscriptor que falla no afecta a los demás"""
+        for evento in eventos:
+            for callback in self.suscriptores:
+                try:
+                    callback(evento)
+                except Exception:
+                    logger.exception("Error al notificar %s del producto %s", evento.tipo, evento.producto_id)
+
+    def actualizar(self, anterior: Optional[Dict[str, Any]], nuevo: Optional[Dict[str, Any]]) -> List[EventoStock]:
+        """Registra el cambio de un producto y devuelve los eventos de umbral que correspondan.
+
+        No los emite: quien aplica el cambio los entrega con ``emitir`` una vez que
+        la escritura está en disco y fuera de los bloqueos.
+        """
+        if nuevo is None:
+            if anterior is not None:
+                self.bajos.pop(anterior["id"], None)
+            return []
+        producto_id, stock, umbral = nuevo["id"], nuevo["stock"], stock_minimo_de(nuevo)
+        if stock <= umbral:
+            if self.bajos.get(producto_id, ())[:2] != (stock, umbral):
+                self._secuencia += 1
+                self.bajos[producto_id] = (stock, umbral, self._secuencia)
+                heapq.heappush(self._heap, (stock - umbral, self._secuencia, producto_id))
+                self._compactar()
+        else:
+            self.bajos.pop(producto_id, None)
+        return list(self._eventos(anterior, producto_id, stock, umbral))
+
+    def _eventos(self, anterior: Optional[Dict[str, Any]], producto_id: str, stock: int, umbral: int):
+        stock_anterior = anterior["stock"] if anterior else None
+        umbral_anterior = stock_minimo_de(anterior) if anterior else None
+        estaba_bajo = anterior is not None and stock_anterior <= umbral_anterior
+        if stock <= umbral and not estaba_bajo:
+            yield EventoStock(BAJO_STOCK, producto_id, stock, umbral)
+        if stock <= 0 and (stock_anterior is None or stock_anterior > 0):
+            yield EventoStock(AGOTADO, producto_id, stock, umbral)
+        if stock < 0 and stock_anterior is not None and stock < stock_anterior:
+            yield EventoStock(STOCK_NEGATIVO, producto_id, stock, umbral)
+        if stock > umbral and estaba_bajo:
+            yield EventoStock(REPUESTO, producto_id, stock, umbral)
+
+    def _compactar(self) -> None:
+        if len(self._heap) > 2 * len(self.bajos) + 16:
+            self._heap = [(stock - umbral, seq, pid) for pid, (stock, umbral, seq) in self.bajos.items()]
+            heapq.heapify(self._heap)
+
+    def _vigente(self, entrada: Tuple[int, int, str]) -> bool:
+        _, secuencia, producto_id = entrada
+        return self.bajos.get(producto_id, (None, None, None))[2] == secuencia
+
+    def bajo_stock(self, limit: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """Productos con stock bajo como (producto_id, stock, stock_minimo), más urgentes primero"""
+        self._compactar()
+        limit = len(self.bajos) if limit is None else limit
+        vigentes = (entrada for entrada in self._heap if self._vigente(entrada))
+        return [(pid,) + self.bajos[pid][:2] for _, _, pid in heapq.nsmallest(limit, vigentes)]
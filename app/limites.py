@@ -0,0 +1,168 @@
+"""
+Límite de peticiones por cliente y ruta, y descarte de carga por prioridad.
+
+Cada par (cliente, ruta) tiene un cubo de tokens: las peticiones que lo agotan
+reciben 429 con ``Retry-After``. Las rutas se clasifican por prioridad:
+
+- alta: cobrar (``POST /ventas/``) y el health check; nunca se descartan por carga.
+- baja: los reportes, que son las consultas más costosas.
+- normal: el resto.
+
+Un monitor mide el retraso del bucle de eventos y se consulta cuántas
+escrituras esperan turno en el almacenamiento. Cuando alguno supera su umbral
+se responden 503 con ``Retry-After`` a las peticiones de prioridad baja y a las
+escrituras que no son ventas (compiten con ellas por la cola de escrituras), y
+si lo duplica también a las lecturas de prioridad normal, para que el servidor
+siga libre para registrar ventas.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import settings
+from .database import AsyncDatabaseManager, async_db_manager
+
+ALTA = "alta"
+NORMAL = "normal"
+BAJA = "baja"
+
+RUTAS_PRIORITARIAS = {("POST", "/ventas/"), ("GET", "/health")}
+PREFIJOS_BAJA_PRIORIDAD = ("/reportes/",)
+METODOS_ESCRITURA = {"POST", "PUT", "PATCH", "DELETE"}
+
+def prioridad_de(metodo: str, ruta: str) -> str:
+    if (metodo, ruta) in RUTAS_PRIORITARIAS:
+        return ALTA
+    if ruta.startswith(PREFIJOS_BAJA_PRIORIDAD):
+        return BAJA
+    return NORMAL
+
+class CuboTokens:
+    """Cubo de tokens: admite ráfagas de ``capacidad`` y repone ``tasa`` tokens por segundo"""
+
+    __slots__ = ("tasa", "capacidad", "tokens", "actualizado")
+
+    def __init__(self, tasa: float, capacidad: float, ahora: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self.actualizado = ahora
+
+    def consumir(self, ahora: float) -> float:
+        """Toma un token; devuelve 0 si lo había o los segundos hasta que haya uno"""
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.actualizado) * self.tasa)
+        self.actualizado = ahora
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.tasa
+
+class MonitorCarga:
+    """Mide cuánto se retrasa el bucle de eventos respecto a un temporizador periódico"""
+
+    def __init__(self, intervalo_ms: Optional[float] = None):
+        self.intervalo = (settings.CARGA_MUESTREO_MS if intervalo_ms is None else intervalo_ms) / 1000
+        self.retraso_ms = 0.0
+        self._tarea: Optional[asyncio.Task] = None
+
+    async def _medir(self) -> None:
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(self.intervalo)
+            self.retraso_ms = max(0.0, (time.perf_counter() - inicio - self.intervalo) * 1000)
+
+    def iniciar(self) -> None:
+        if self._tarea is None:
+            self._tarea = asyncio.get_running_loop().create_task(self._medir())
+
+    def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+        self.retraso_ms = 0.0
+
+monitor_carga = MonitorCarga()
+
+class LimitesMiddleware:
+    def __init__(self, app: ASGIApp, db: Optional[AsyncDatabaseManager] = None,
+                 monitor: Optional[MonitorCarga] = None):
+        self.app = app
+        self.db = db or async_db_manager
+        self.monitor = monitor or monitor_carga
+        # (cliente, método, ruta) -> cubo, expulsando los menos usados
+        self._cubos: "OrderedDict[Tuple[str, str, str], CuboTokens]" = OrderedDict()
+        # path -> plantilla de la ruta (p. ej. /productos/{producto_id}), para no
+        # crear un cubo por cada id
+        self._rutas: Optional[List[Tuple[Pattern, str]]] = None
+        self._plantillas: Dict[str, str] = {}
+
+    def _plantilla(self, scope: Scope) -> str:
+        path = scope["path"]
+        plantilla = self._plantillas.get(path)
+        if plantilla is None:
+            if self._rutas is None:
+                # Las rutas del esquema OpenAPI conservan el orden de declaración de los routers
+                self._rutas = [(compile_path(ruta)[0], ruta) for ruta in scope["app"].openapi().get("paths", {})]
+            plantilla = next((ruta for patron, ruta in self._rutas if patron.match(path)), path)
+            if len(self._plantillas) < settings.LIMITE_MAX_CUBOS:
+                self._plantillas[path] = plantilla
+        return plantilla
+
+    def _tasa(self, prioridad: str) -> Tuple[float, float]:
+        if prioridad == BAJA:
+            return settings.LIMITE_TASA_REPORTES, settings.LIMITE_RAFAGA_REPORTES
+        return settings.LIMITE_TASA, settings.LIMITE_RAFAGA
+
+    def _esperar(self, cliente: str, metodo: str, ruta: str, prioridad: str) -> float:
+        ahora = time.monotonic()
+        clave = (cliente, metodo, ruta)
+        cubo = self._cubos.get(clave)
+        if cubo is None:
+            cubo = self._cubos[clave] = CuboTokens(*self._tasa(prioridad), ahora)
+            if len(self._cubos) > settings.LIMITE_MAX_CUBOS:
+                self._cubos.popitem(last=False)
+        else:
+            self._cubos.move_to_end(clave)
+        return cubo.consumir(ahora)
+
+    def nivel_carga(self) -> float:
+        """Carga relativa a los umbrales: 1 o más significa sobrecarga"""
+        return max(
+            self.db.escrituras_pendientes / settings.CARGA_COLA_ESCRITURAS_MAX,
+            self.monitor.retraso_ms / settings.CARGA_RETRASO_MAX_MS,
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.LIMITES_ACTIVOS:
+            return await self.app(scope, receive, send)
+        ruta = self._plantilla(scope)
+        prioridad = prioridad_de(scope["method"], ruta)
+
+        if prioridad != ALTA:
+            nivel = self.nivel_carga()
+            umbral = 1 if prioridad == BAJA or scope["method"] in METODOS_ESCRITURA else 2
+            if nivel >= umbral:
+                respuesta = JSONResponse(
+                    {"detail": "Servidor con mucha carga, intente más tarde"},
+                    status_code=503,
+                    headers={"Retry-After": str(settings.CARGA_RETRY_AFTER_SEGUNDOS)},
+                )
+                return await respuesta(scope, receive, send)
+
+        cliente = scope["client"][0] if scope.get("client") else "desconocido"
+        espera = self._esperar(cliente, scope["method"], ruta, prioridad)
+        if espera > 0:
+            respuesta = JSONResponse(
+                {"detail": "Demasiadas peticiones"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(espera)))},
+            )
+            return await respuesta(scope, receive, send)
+        await self.app(scope, receive, send)
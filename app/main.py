@@ -1,8 +1,23 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 from .routers import productos, clientes, ventas, reportes
 from .config import settings
+from .database import async_db_manager
+from .idempotencia import IdempotenciaMiddleware
+from .limites import LimitesMiddleware, monitor_carga
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Abre el almacenamiento al arrancar, no al importar los módulos"""
+    await async_db_manager.open()
+    monitor_carga.iniciar()
+    yield
+    monitor_carga.detener()
+    async_db_manager.close()
 
 # Crear la aplicación FastAPI
 app = FastAPI(
@@ -10,9 +25,26 @@ app = FastAPI(
     description=settings.APP_DESCRIPTION,
     version=settings.APP_VERSION,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+# Reintentos de POST con la misma Idempotency-Key devuelven la respuesta original
+app.add_middleware(IdempotenciaMiddleware)
+
+# Comprime el resto de respuestas grandes; los listados completos ya llegan
+# comprimidos desde su caché y el middleware no los vuelve a tocar
+if settings.COMPRESION_ACTIVA:
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=settings.COMPRESION_MINIMA_BYTES,
+        compresslevel=settings.COMPRESION_NIVEL_GZIP
+    )
+
+# Limita las peticiones por cliente y ruta y descarta las de baja prioridad con
+# sobrecarga; va por fuera del resto para rechazar antes de hacer trabajo
+app.add_middleware(LimitesMiddleware)
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
 
 # Modelos para Productos
 class ProductoBase(BaseModel):
@@ -7,6 +7,8 @@ class ProductoBase(BaseModel):
     precio: float
     stock: int
     categoria: str
+    # Umbral de reposición; si no se indica se usa STOCK_MINIMO_DEFAULT
+    stock_minimo: Optional[int] = None
 
 class Producto(ProductoBase):
     id: str
@@ -15,6 +17,19 @@ class Producto(ProductoBase):
 class ProductoCreate(ProductoBase):
     pass
 
+class ProductoRelacionado(BaseModel):
+    producto_id: str
+    nombre: str
+    veces_comprados_juntos: int
+
+class AlertaStock(BaseModel):
+    producto_id: str
+    nombre: str
+    categoria: str
+    stock: int
+    stock_minimo: int
+    faltante: int
+
 # Modelos para Clientes
 class ClienteBase(BaseModel):
     nombre: str
@@ -57,4 +72,36 @@ class ReporteVentas(BaseModel):
 class ProductoPopular(BaseModel):
     producto_id: str
     nombre: str
-    cantidad_vendida: int 
\ No newline at end of file
+    cantidad_vendida: int
+
+class VentasPeriodo(BaseModel):
+    periodo: str
+    ventas: int
+    ingresos: float
+
+class ReporteVentasPeriodo(BaseModel):
+    agrupacion: str
+    total_ventas: int
+    total_ingresos: float
+    promedio_por_venta: float
+    periodos: List[VentasPeriodo]
+    productos_populares: List[ProductoPopular]
+
+class ClienteRFM(BaseModel):
+    cliente_id: str
+    nombre: str
+    ultima_compra: str
+    dias_desde_ultima_compra: int
+    pedidos: int
+    gasto_total: float
+    # Puntuaciones 1-5 por quintil (5 es mejor)
+    recencia: int
+    frecuencia: int
+    monto: int
+    segmento: str
+
+class ReporteClientes(BaseModel):
+    total_clientes: int
+    clientes_con_compras: int
+    segmentos: Dict[str, int]
+    top_clientes: List[ClienteRFM] 
\ No newline at end of file
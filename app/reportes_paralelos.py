@@ -0,0 +1,119 @@
+"""
+Reportes de ventas sobre el historial particionado por mes.
+
+Cada partición (ventas con el mismo ``fecha[:7]``) se agrega por separado en
+un acumulado parcial: número de ventas, ingresos, unidades por producto y
+ventas por hora. Los parciales se combinan después en un solo resultado.
+
+Las ventas no se modifican una vez registradas y cada partición solo crece por
+el final, así que el parcial de un mes se guarda en caché junto al número de
+ventas y el id de la última que cubre. En cada reporte solo se copian y
+agregan las ventas nuevas de los meses que crecieron (normalmente unas pocas
+del mes en curso) y se suman al parcial guardado.
+
+Los parciales no se reparten entre procesos: agregar una venta cuesta menos
+de un microsegundo y serializarla hacia otro proceso cuesta varias veces más,
+así que un pool solo haría más lento el reporte.
+"""
+
+import threading
+from typing import Dict, List, Any, Tuple
+
+# (ventas, ingresos, unidades por producto, {hora: [ventas, ingresos]})
+Parcial = Tuple[int, float, Dict[str, int], Dict[str, List[float]]]
+
+# Longitud del prefijo de la fecha ISO que identifica cada periodo
+AGRUPACIONES = {"hora": 13, "dia": 10, "mes": 7}
+
+def agregar_particion(ventas: List[Dict[str, Any]]) -> Parcial:
+    """Acumulado parcial de una lista de ventas"""
+    ingresos = 0.0
+    unidades: Dict[str, int] = {}
+    por_hora: Dict[str, List[float]] = {}
+    for venta in ventas:
+        total = venta["total"]
+        ingresos += total
+        hora = venta["fecha"][:13]
+        acumulado = por_hora.get(hora)
+        if acumulado is None:
+            por_hora[hora] = [1, total]
+        else:
+            acumulado[0] += 1
+            acumulado[1] += total
+        for item in venta["items"]:
+            unidades[item["producto_id"]] = unidades.get(item["producto_id"], 0) + item["cantidad"]
+    return len(ventas), ingresos, unidades, por_hora
+
+def combinar(parciales: List[Parcial], agrupacion: str = "dia") -> Parcial:
+    """Combina los parciales y reagrupa las horas al periodo pedido"""
+    largo = AGRUPACIONES[agrupacion]
+    total_ventas, total_ingresos = 0, 0.0
+    unidades: Dict[str, int] = {}
+    periodos: Dict[str, List[float]] = {}
+    for ventas, ingresos, unidades_parcial, por_hora in parciales:
+        total_ventas += ventas
+        total_ingresos += ingresos
+        for producto_id, cantidad in unidades_parcial.items():
+            unidades[producto_id] = unidades.get(producto_id, 0) + cantidad
+        for hora, (n, monto) in por_hora.items():
+            periodo = periodos.setdefault(hora[:largo], [0, 0.0])
+            periodo[0] += n
+            periodo[1] += monto
+    return total_ventas, total_ingresos, unidades, periodos
+
+# mes -> (ventas que cubre el parcial, id de la última, parcial)
+Cache = Dict[str, Tuple[int, str, Parcial]]
+
+def ventas_nuevas(ventas_por_mes: Dict[str, List[Dict[str, Any]]],
+                  cache: Cache) -> Dict[str, Tuple[int, List[Dict[str, Any]]]]:
+    """Por mes, (ventas ya cubiertas por la caché, copia de las siguientes).
+
+    Si el mes no está en la caché o su principio ya no coincide (el historial
+    se reemplazó) se copia entero con 0 cubiertas. Se llama con el bloqueo de
+    los índices tomado, así que solo copia lo imprescindible.
+    """
+    resultado = {}
+    for mes, ventas in ventas_por_mes.items():
+        n, ultima, _ = cache.get(mes, (0, "", None))
+        if n and (len(ventas) < n or ventas[n - 1]["id"] != ultima):
+            n = 0
+        resultado[mes] = (n, ventas[n:])
+    return resultado
+
+class MotorReportes:
+    """Mantiene un parcial por mes y lo extiende con las ventas nuevas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache: Cache = {}
+
+    def cache(self) -> Cache:
+        """Copia de la caché para pasar a ``ventas_nuevas`` y luego a ``parciales``"""
+        with self._lock:
+            return dict(self._cache)
+
+    def parciales(self, nuevas: Dict[str, Tuple[int, List[Dict[str, Any]]]], cache: Cache) -> List[Parcial]:
+        """Parcial de cada mes sumando sus ventas nuevas al parcial de ``cache``"""
+        resultado: Dict[str, Parcial] = {}
+        actualizados: Cache = {}
+        for mes, (n, ventas) in nuevas.items():
+            if n and not ventas:
+                resultado[mes] = cache[mes][2]
+                continue
+            parcial = agregar_particion(ventas)
+            if n:
+                parcial = combinar([cache[mes][2], parcial], "hora")
+            if parcial[0]:
+                actualizados[mes] = (n + len(ventas), ventas[-1]["id"], parcial)
+                resultado[mes] = parcial
+        with self._lock:
+            for mes, entrada in actualizados.items():
+                # Otro reporte simultáneo pudo guardar ya un parcial más completo
+                actual = self._cache.get(mes)
+                if actual is cache.get(mes) or actual[0] <= entrada[0]:
+                    self._cache[mes] = entrada
+        return [resultado[mes] for mes in sorted(resultado)]
+
+    def reporte(self, particiones: Dict[str, List[Dict[str, Any]]], agrupacion: str = "dia") -> Parcial:
+        cache = self.cache()
+        return combinar(self.parciales(ventas_nuevas(particiones, cache), cache), agrupacion)
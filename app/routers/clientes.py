@@ -1,8 +1,8 @@
 from fastapi import APIRouter, HTTPException
-from typing import List
+from typing import List, Literal, Optional
 
 from ..models import Cliente, ClienteCreate
-from ..services import ClienteService
+from ..services import AsyncClienteService
 
 router = APIRouter(
     prefix="/clientes",
@@ -13,24 +13,29 @@ router = APIRouter(
 @router.get("/", response_model=List[Cliente])
 async def obtener_clientes():
     """Obtiene todos los clientes"""
-    return ClienteService.get_all_clientes()
+    return await AsyncClienteService.get_all_clientes()
+
+@router.get("/buscar", response_model=Cliente)
+async def buscar_cliente(email: Optional[str] = None, telefono: Optional[str] = None):
+    """Busca un cliente por email (sin distinguir mayúsculas) o por los dígitos del teléfono"""
+    return await AsyncClienteService.buscar_cliente(email, telefono)
 
 @router.get("/{cliente_id}", response_model=Cliente)
 async def obtener_cliente(cliente_id: str):
     """Obtiene un cliente específico por su ID"""
-    return ClienteService.get_cliente_by_id(cliente_id)
+    return await AsyncClienteService.get_cliente_by_id(cliente_id)
 
 @router.post("/", response_model=Cliente)
 async def crear_cliente(cliente: ClienteCreate):
     """Crea un nuevo cliente"""
-    return ClienteService.create_cliente(cliente)
+    return await AsyncClienteService.create_cliente(cliente)
 
 @router.put("/{cliente_id}", response_model=Cliente)
 async def actualizar_cliente(cliente_id: str, cliente: ClienteCreate):
     """Actualiza un cliente existente"""
-    return ClienteService.update_cliente(cliente_id, cliente)
+    return await AsyncClienteService.update_cliente(cliente_id, cliente)
 
 @router.delete("/{cliente_id}")
-async def eliminar_cliente(cliente_id: str):
-    """Elimina un cliente"""
-    return ClienteService.delete_cliente(cliente_id) 
\ No newline at end of file
+async def eliminar_cliente(cliente_id: str, modo: Optional[Literal["rechazar", "archivar"]] = None):
+    """Elimina un cliente; con ventas asociadas lo rechaza o lo archiva según ``modo``"""
+    return await AsyncClienteService.delete_cliente(cliente_id, modo) 
\ No newline at end of file
@@ -1,8 +1,8 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Literal, Optional
 
-from ..models import Producto, ProductoCreate
-from ..services import ProductoService
+from ..models import Producto, ProductoCreate, AlertaStock, ProductoRelacionado
+from ..services import AsyncProductoService
 
 router = APIRouter(
     prefix="/productos",
@@ -11,26 +11,38 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[Producto])
-async def obtener_productos():
+async def obtener_productos(request: Request):
     """Obtiene todos los productos"""
-    return ProductoService.get_all_productos()
+    return await AsyncProductoService.get_catalogo(
+        request.headers.get("accept-encoding"), request.headers.get("if-none-match")
+    )
+
+@router.get("/bajo-stock", response_model=List[AlertaStock])
+async def obtener_productos_bajo_stock(limit: Optional[int] = Query(None, ge=1)):
+    """Obtiene los productos en o por debajo de su umbral de reposición"""
+    return await AsyncProductoService.get_productos_bajo_stock(limit)
 
 @router.get("/{producto_id}", response_model=Producto)
 async def obtener_producto(producto_id: str):
     """Obtiene un producto específico por su ID"""
-    return ProductoService.get_producto_by_id(producto_id)
+    return await AsyncProductoService.get_producto_by_id(producto_id)
+
+@router.get("/{producto_id}/relacionados", response_model=List[ProductoRelacionado])
+async def obtener_productos_relacionados(producto_id: str, limit: int = Query(5, ge=1, le=50)):
+    """Obtiene los productos que se compran frecuentemente junto a este"""
+    return await AsyncProductoService.get_productos_relacionados(producto_id, limit)
 
 @router.post("/", response_model=Producto)
 async def crear_producto(producto: ProductoCreate):
     """Crea un nuevo producto"""
-    return ProductoService.create_producto(producto)
+    return await AsyncProductoService.create_producto(producto)
 
 @router.put("/{producto_id}", response_model=Producto)
 async def actualizar_producto(producto_id: str, producto: ProductoCreate):
     """Actualiza un producto existente"""
-    return ProductoService.update_producto(producto_id, producto)
+    return await AsyncProductoService.update_producto(producto_id, producto)
 
 @router.delete("/{producto_id}")
-async def eliminar_producto(producto_id: str):
-    """Elimina un producto"""
-    return ProductoService.delete_producto(producto_id) 
\ No newline at end of file
+async def eliminar_producto(producto_id: str, modo: Optional[Literal["rechazar", "archivar"]] = None):
+    """Elimina un producto; con ventas asociadas lo rechaza o lo archiva según ``modo``"""
+    return await AsyncProductoService.delete_producto(producto_id, modo) 
\ No newline at end of file
@@ -1,8 +1,8 @@
-from fastapi import APIRouter
-from typing import List
+from fastapi import APIRouter, Query
+from typing import List, Literal, Optional
 
-from ..models import ReporteVentas, ProductoPopular
-from ..services import ReporteService
+from ..models import ReporteVentas, ReporteVentasPeriodo, ProductoPopular, ReporteClientes
+from ..services import AsyncReporteService
 
 router = APIRouter(
     prefix="/reportes",
@@ -13,9 +13,32 @@ router = APIRouter(
 @router.get("/ventas-totales", response_model=ReporteVentas)
 async def reporte_ventas_totales():
     """Genera reporte de estadísticas generales de ventas"""
-    return ReporteService.get_ventas_totales()
+    return await AsyncReporteService.get_ventas_totales()
+
+@router.get("/ventas-por-periodo", response_model=ReporteVentasPeriodo)
+async def reporte_ventas_por_periodo(
+    agrupacion: Literal["hora", "dia", "mes"] = "dia",
+    desde: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Mes inicial (YYYY-MM)"),
+    hasta: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Mes final (YYYY-MM)"),
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Genera el reporte de ventas por periodo y los productos más vendidos en el rango"""
+    return await AsyncReporteService.get_ventas_por_periodo(agrupacion, desde, hasta, limit)
 
 @router.get("/productos-populares", response_model=List[ProductoPopular])
-async def reporte_productos_populares():
+async def reporte_productos_populares(
+    limit: int = Query(10, ge=1, le=100),
+    categoria: Optional[str] = None,
+    ventana_minutos: Optional[int] = Query(None, description="Solo ventas de los últimos N minutos")
+):
     """Genera reporte de los productos más populares"""
-    return ReporteService.get_productos_populares() 
\ No newline at end of file
+    return await AsyncReporteService.get_productos_populares(limit, categoria, ventana_minutos)
+
+@router.get("/clientes", response_model=ReporteClientes)
+async def reporte_clientes(
+    top: int = Query(10, ge=1, le=100),
+    orden: Literal["monto", "frecuencia", "recencia"] = "monto",
+    segmento: Optional[str] = None
+):
+    """Genera el reporte RFM: segmentos de clientes y ranking top-N"""
+    return await AsyncReporteService.get_reporte_clientes(top, orden, segmento)
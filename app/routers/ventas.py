@@ -1,8 +1,9 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Optional
 
 from ..models import Venta, VentaCreate
-from ..services import VentaService
+from ..services import AsyncVentaService
 
 router = APIRouter(
     prefix="/ventas",
@@ -11,21 +12,29 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[Venta])
-async def obtener_ventas():
-    """Obtiene todas las ventas"""
-    return VentaService.get_all_ventas()
+async def obtener_ventas(
+    request: Request,
+    desde: Optional[datetime] = Query(None, description="Solo ventas desde este momento (ISO 8601)"),
+    hasta: Optional[datetime] = Query(None, description="Solo ventas hasta este momento (ISO 8601)")
+):
+    """Obtiene todas las ventas, opcionalmente filtradas por rango de fechas"""
+    if desde is None and hasta is None:
+        return await AsyncVentaService.get_historial(
+            request.headers.get("accept-encoding"), request.headers.get("if-none-match")
+        )
+    return await AsyncVentaService.get_all_ventas(desde, hasta)
 
 @router.get("/{venta_id}", response_model=Venta)
 async def obtener_venta(venta_id: str):
     """Obtiene una venta específica por su ID"""
-    return VentaService.get_venta_by_id(venta_id)
+    return await AsyncVentaService.get_venta_by_id(venta_id)
 
 @router.post("/", response_model=Venta)
 async def crear_venta(venta: VentaCreate):
     """Crea una nueva venta"""
-    return VentaService.create_venta(venta)
+    return await AsyncVentaService.create_venta(venta)
 
 @router.get("/cliente/{cliente_id}", response_model=List[Venta])
 async def obtener_ventas_por_cliente(cliente_id: str):
     """Obtiene todas las ventas de un cliente específico"""
-    return VentaService.get_ventas_by_cliente(cliente_id) 
\ No newline at end of file
+    return await AsyncVentaService.get_ventas_by_cliente(cliente_id) 
\ No newline at end of file
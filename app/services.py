@@ -1,8 +1,14 @@
-from typing import List, Dict, Any
-from fastapi import HTTPException
+import heapq
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from fastapi import HTTPException, Response
 
-from .models import Producto, ProductoCreate, Cliente, ClienteCreate, Venta, VentaCreate, ReporteVentas, ProductoPopular
-from .database import db_manager
+from .models import Producto, ProductoCreate, AlertaStock, ProductoRelacionado, Cliente, ClienteCreate, Venta, VentaCreate, ReporteVentas, ReporteVentasPeriodo, VentasPeriodo, ProductoPopular, ClienteRFM, ReporteClientes
+from .config import settings
+from .database import db_manager, async_db_manager, RegistroDuplicadoError, RegistroReferenciadoError, RegistroInexistenteError, StockInsuficienteError
+from .compresion import cache_respuestas, serializar_modelos
+from .indices import SEGMENTOS_RFM, top_k
 from .utils import generate_id, get_current_timestamp, validate_email, validate_phone, calculate_total
 
 class ProductoService:
@@ -12,6 +18,15 @@ class ProductoService:
         productos_data = db_manager.get_productos()
         return [Producto(**producto) for producto in productos_data]
     
+    @staticmethod
+    def get_catalogo(accept_encoding: Optional[str] = None, if_none_match: Optional[str] = None) -> Response:
+        """Catálogo completo ya serializado y comprimido, regenerado solo si cambian los productos"""
+        return cache_respuestas.respuesta(
+            "productos", db_manager.version_coleccion("productos"),
+            lambda: serializar_modelos(ProductoService.get_all_productos()),
+            accept_encoding, if_none_match
+        )
+    
     @staticmethod
     def get_producto_by_id(producto_id: str) -> Producto:
         """Obtiene un producto por su ID"""
@@ -51,12 +66,49 @@ class ProductoService:
         return producto_actualizado
     
     @staticmethod
-    def delete_producto(producto_id: str) -> Dict[str, str]:
-        """Elimina un producto"""
-        success = db_manager.delete_producto(producto_id)
+    def delete_producto(producto_id: str, modo: Optional[str] = None) -> Dict[str, str]:
+        """Elimina un producto; si tiene ventas lo rechaza o lo archiva según ``modo``"""
+        modo = modo or settings.DELETE_MODE
+        if modo == "archivar" and db_manager.count_ventas_producto(producto_id):
+            if not db_manager.archive_producto(producto_id):
+                raise HTTPException(status_code=404, detail="Producto no encontrado")
+            return {"mensaje": "Producto archivado: tiene ventas asociadas"}
+        try:
+            success = db_manager.delete_producto(producto_id)
+        except RegistroReferenciadoError as exc:
+            raise HTTPException(status_code=409, detail=f"El producto tiene {exc.referencias} ventas asociadas")
         if not success:
             raise HTTPException(status_code=404, detail="Producto no encontrado")
         return {"mensaje": "Producto eliminado exitosamente"}
+    
+    @staticmethod
+    def get_productos_bajo_stock(limit: Optional[int] = None) -> List[AlertaStock]:
+        """Obtiene los productos en o por debajo de su umbral, más urgentes primero"""
+        return [
+            AlertaStock(
+                producto_id=producto["id"],
+                nombre=producto["nombre"],
+                categoria=producto["categoria"],
+                stock=producto["stock"],
+                stock_minimo=stock_minimo,
+                faltante=stock_minimo - producto["stock"]
+            )
+            for producto, stock_minimo in db_manager.get_productos_bajo_stock(limit)
+        ]
+
+    @staticmethod
+    def get_productos_relacionados(producto_id: str, limit: int = 5) -> List[ProductoRelacionado]:
+        """Obtiene los productos comprados frecuentemente junto a otro"""
+        if not db_manager.get_producto_by_id(producto_id):
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        return [
+            ProductoRelacionado(
+                producto_id=producto["id"],
+                nombre=producto["nombre"],
+                veces_comprados_juntos=veces
+            )
+            for producto, veces in db_manager.get_productos_relacionados(producto_id, limit)
+        ]
 
 class ClienteService:
     @staticmethod
@@ -88,7 +140,10 @@ class ClienteService:
             **cliente.dict(),
             fecha_registro=get_current_timestamp()
         )
-        db_manager.add_cliente(nuevo_cliente.dict())
+        try:
+            db_manager.add_cliente(nuevo_cliente.dict())
+        except RegistroDuplicadoError as exc:
+            raise HTTPException(status_code=409, detail=f"Ya existe un cliente con ese {exc.campo}")
         return nuevo_cliente
     
     @staticmethod
@@ -104,27 +159,63 @@ class ClienteService:
             fecha_registro=cliente_existente["fecha_registro"]
         )
         
-        success = db_manager.update_cliente(cliente_id, cliente_actualizado.dict())
+        try:
+            success = db_manager.update_cliente(cliente_id, cliente_actualizado.dict())
+        except RegistroDuplicadoError as exc:
+            raise HTTPException(status_code=409, detail=f"Ya existe un cliente con ese {exc.campo}")
         if not success:
             raise HTTPException(status_code=404, detail="Cliente no encontrado")
         
         return cliente_actualizado
     
     @staticmethod
-    def delete_cliente(cliente_id: str) -> Dict[str, str]:
-        """Elimina un cliente"""
-        success = db_manager.delete_cliente(cliente_id)
+    def delete_cliente(cliente_id: str, modo: Optional[str] = None) -> Dict[str, str]:
+        """Elimina un cliente; si tiene ventas lo rechaza o lo archiva según ``modo``"""
+        modo = modo or settings.DELETE_MODE
+        if modo == "archivar" and db_manager.count_ventas_cliente(cliente_id):
+            if not db_manager.archive_cliente(cliente_id):
+                raise HTTPException(status_code=404, detail="Cliente no encontrado")
+            return {"mensaje": "Cliente archivado: tiene ventas asociadas"}
+        try:
+            success = db_manager.delete_cliente(cliente_id)
+        except RegistroReferenciadoError as exc:
+            raise HTTPException(status_code=409, detail=f"El cliente tiene {exc.referencias} ventas asociadas")
         if not success:
             raise HTTPException(status_code=404, detail="Cliente no encontrado")
         return {"mensaje": "Cliente eliminado exitosamente"}
+    
+    @staticmethod
+    def buscar_cliente(email: Optional[str] = None, telefono: Optional[str] = None) -> Cliente:
+        """Busca un cliente por email o teléfono"""
+        if not email and not telefono:
+            raise HTTPException(status_code=400, detail="Indique email o telefono")
+        cliente_data = db_manager.find_cliente(email=email, telefono=telefono)
+        if not cliente_data:
+            raise HTTPException(status_code=404, detail="Cliente no encontrado")
+        return Cliente(**cliente_data)
 
 class VentaService:
     @staticmethod
-    def get_all_ventas() -> List[Venta]:
-        """Obtiene todas las ventas"""
-        ventas_data = db_manager.get_ventas()
+    def get_all_ventas(desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> List[Venta]:
+        """Obtiene todas las ventas, o solo las de un rango de fechas"""
+        if desde is None and hasta is None:
+            ventas_data = db_manager.get_ventas()
+        else:
+            ventas_data = db_manager.get_ventas_entre(
+                desde.timestamp() if desde else None,
+                hasta.timestamp() if hasta else None
+            )
         return [Venta(**venta) for venta in ventas_data]
     
+    @staticmethod
+    def get_historial(accept_encoding: Optional[str] = None, if_none_match: Optional[str] = None) -> Response:
+        """Historial completo de ventas serializado y comprimido una vez por cada cambio"""
+        return cache_respuestas.respuesta(
+            "ventas", db_manager.version_coleccion("ventas"),
+            lambda: serializar_modelos(VentaService.get_all_ventas()),
+            accept_encoding, if_none_match
+        )
+    
     @staticmethod
     def get_venta_by_id(venta_id: str) -> Venta:
         """Obtiene una venta por su ID"""
@@ -136,21 +227,10 @@ class VentaService:
     @staticmethod
     def create_venta(venta: VentaCreate) -> Venta:
         """Crea una nueva venta"""
-        # Validar que el cliente existe
-        cliente_existe = db_manager.get_cliente_by_id(venta.cliente_id)
-        if not cliente_existe:
-            raise HTTPException(status_code=404, detail="Cliente no encontrado")
-        
-        # Validar productos y calcular total
+        # Cliente, productos y stock se validan al registrarla, con el bloqueo de
+        # escritura tomado, para que dos ventas simultáneas no vendan el mismo stock
         total = 0
         for item in venta.items:
-            producto = db_manager.get_producto_by_id(item.producto_id)
-            if not producto:
-                raise HTTPException(status_code=404, detail=f"Producto {item.producto_id} no encontrado")
-            
-            if producto["stock"] < item.cantidad:
-                raise HTTPException(status_code=400, detail=f"Stock insuficiente para {producto['nombre']}")
-            
             total += item.precio_unitario * item.cantidad
         
         # Crear la venta
@@ -163,11 +243,15 @@ class VentaService:
             estado="completada"
         )
         
-        # Actualizar stock de productos
-        for item in venta.items:
-            db_manager.update_producto_stock(item.producto_id, item.cantidad)
-        
-        db_manager.add_venta(nueva_venta.dict())
+        # Actualizar stock de productos y registrar la venta en una sola escritura
+        try:
+            db_manager.registrar_venta(nueva_venta.dict())
+        except RegistroInexistenteError as exc:
+            if exc.coleccion == "cliente":
+                raise HTTPException(status_code=404, detail="Cliente no encontrado")
+            raise HTTPException(status_code=404, detail=f"Producto {exc.registro_id} no encontrado")
+        except StockInsuficienteError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
         return nueva_venta
     
     @staticmethod
@@ -180,9 +264,7 @@ class ReporteService:
     @staticmethod
     def get_ventas_totales() -> ReporteVentas:
         """Genera reporte de ventas totales"""
-        ventas = db_manager.get_ventas()
-        total_ventas = len(ventas)
-        total_ingresos = sum(venta["total"] for venta in ventas)
+        total_ventas, total_ingresos, _, _ = db_manager.get_reporte_ventas("mes")
         promedio_por_venta = total_ingresos / total_ventas if total_ventas > 0 else 0
         
         return ReporteVentas(
@@ -192,31 +274,222 @@ class ReporteService:
         )
     
     @staticmethod
-    def get_productos_populares() -> List[ProductoPopular]:
+    def get_productos_populares(limit: int = 10, categoria: Optional[str] = None,
+                                ventana_minutos: Optional[int] = None) -> List[ProductoPopular]:
         """Genera reporte de productos más populares"""
-        ventas = db_manager.get_ventas()
-        productos = db_manager.get_productos()
-        
-        # Contar productos vendidos
-        productos_vendidos = {}
-        for venta in ventas:
-            for item in venta["items"]:
-                if item["producto_id"] not in productos_vendidos:
-                    productos_vendidos[item["producto_id"]] = 0
-                productos_vendidos[item["producto_id"]] += item["cantidad"]
+        if ventana_minutos is not None and ventana_minutos not in settings.POPULARES_VENTANAS_MINUTOS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Ventana no disponible; use una de {settings.POPULARES_VENTANAS_MINUTOS}"
+            )
         
-        # Crear diccionario de nombres de productos
-        productos_info = {producto["id"]: producto["nombre"] for producto in productos}
-        
-        # Crear lista de productos populares
+        # Los conteos se mantienen en memoria; aquí solo se seleccionan los k mayores
+        return ReporteService._productos_populares(db_manager.get_top_productos(limit, categoria, ventana_minutos))
+
+    @staticmethod
+    def _productos_populares(top: List[Tuple[str, int]]) -> List[ProductoPopular]:
+        """Resuelve los nombres de pares (producto_id, cantidad)"""
         productos_populares = []
-        for producto_id, cantidad in productos_vendidos.items():
+        for producto_id, cantidad in top:
+            producto = db_manager.get_producto_by_id(producto_id, incluir_archivados=True)
             productos_populares.append(ProductoPopular(
                 producto_id=producto_id,
-                nombre=productos_info.get(producto_id, "Producto desconocido"),
+                nombre=producto["nombre"] if producto else "Producto desconocido",
                 cantidad_vendida=cantidad
             ))
+        return productos_populares
+
+    @staticmethod
+    def get_ventas_por_periodo(agrupacion: str = "dia", desde: Optional[str] = None,
+                               hasta: Optional[str] = None, limit: int = 10) -> ReporteVentasPeriodo:
+        """Genera el reporte de ventas agrupadas por periodo entre dos meses (YYYY-MM)"""
+        total_ventas, total_ingresos, unidades, periodos = db_manager.get_reporte_ventas(agrupacion, desde, hasta)
+        return ReporteVentasPeriodo(
+            agrupacion=agrupacion,
+            total_ventas=total_ventas,
+            total_ingresos=total_ingresos,
+            promedio_por_venta=total_ingresos / total_ventas if total_ventas > 0 else 0,
+            periodos=[
+                VentasPeriodo(periodo=periodo, ventas=ventas, ingresos=ingresos)
+                for periodo, (ventas, ingresos) in sorted(periodos.items())
+            ],
+            productos_populares=ReporteService._productos_populares(top_k(unidades, limit))
+        )
+
+    @staticmethod
+    def get_reporte_clientes(top: int = 10, orden: str = "monto", segmento: Optional[str] = None) -> ReporteClientes:
+        """Genera el reporte RFM (recencia, frecuencia, monto) de clientes"""
+        if segmento is not None and segmento not in SEGMENTOS_RFM:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Segmento no válido; use uno de {list(SEGMENTOS_RFM)}"
+            )
+        
+        # Ambos conteos cubren solo clientes activos: los segmentos suman total_clientes
+        rfm = db_manager.get_rfm_clientes()
+        
+        segmentos: Dict[str, int] = {}
+        for *_, nombre_segmento in rfm:
+            segmentos[nombre_segmento] = segmentos.get(nombre_segmento, 0) + 1
+        total_clientes = len(db_manager.get_clientes())
+        segmentos["sin_compras"] = total_clientes - len(rfm)
         
-        # Ordenar por cantidad vendida y retornar top 10
-        productos_populares.sort(key=lambda x: x.cantidad_vendida, reverse=True)
-        return productos_populares[:10] 
\ No newline at end of file
+        # Ranking top-N con un heap acotado
+        claves = {
+            "monto": lambda fila: fila[1].gasto_total,
+            "frecuencia": lambda fila: fila[1].pedidos,
+            "recencia": lambda fila: fila[1].ultima_compra,
+        }
+        candidatos = rfm if segmento is None else [fila for fila in rfm if fila[5] == segmento]
+        ahora = time.time()
+        top_clientes = []
+        for cliente_id, estadisticas, r, f, m, nombre_segmento in heapq.nlargest(top, candidatos, key=claves[orden]):
+            cliente = db_manager.get_cliente_by_id(cliente_id, incluir_archivados=True)
+            top_clientes.append(ClienteRFM(
+                cliente_id=cliente_id,
+                nombre=cliente["nombre"] if cliente else "Cliente desconocido",
+                ultima_compra=estadisticas.ultima_fecha,
+                dias_desde_ultima_compra=int((ahora - estadisticas.ultima_compra) // 86400),
+                pedidos=estadisticas.pedidos,
+                gasto_total=estadisticas.gasto_total,
+                recencia=r,
+                frecuencia=f,
+                monto=m,
+                segmento=nombre_segmento
+            ))
+        
+        return ReporteClientes(
+            total_clientes=total_clientes,
+            clientes_con_compras=len(rfm),
+            segmentos=segmentos,
+            top_clientes=top_clientes
+        )
+
+# Variantes asíncronas usadas por los routers: reutilizan la lógica de los
+# servicios anteriores y delegan la planificación en async_db_manager. Solo las
+# búsquedas puntuales usan ``read`` (en el bucle si la caché está al día); los
+# listados y reportes, que recorren colecciones enteras, van al executor con ``run``
+class AsyncProductoService:
+    @staticmethod
+    async def get_all_productos() -> List[Producto]:
+        """Obtiene todos los productos"""
+        return await async_db_manager.run(ProductoService.get_all_productos)
+    
+    @staticmethod
+    async def get_catalogo(accept_encoding: Optional[str] = None, if_none_match: Optional[str] = None) -> Response:
+        """Catálogo completo cacheado; serializar y comprimir se hace fuera del bucle de eventos"""
+        return await async_db_manager.run(ProductoService.get_catalogo, accept_encoding, if_none_match)
+    
+    @staticmethod
+    async def get_producto_by_id(producto_id: str) -> Producto:
+        """Obtiene un producto por su ID"""
+        return await async_db_manager.read(ProductoService.get_producto_by_id, producto_id)
+    
+    @staticmethod
+    async def create_producto(producto: ProductoCreate) -> Producto:
+        """Crea un nuevo producto"""
+        return await async_db_manager.write(ProductoService.create_producto, producto)
+    
+    @staticmethod
+    async def update_producto(producto_id: str, producto: ProductoCreate) -> Producto:
+        """Actualiza un producto existente"""
+        return await async_db_manager.write(ProductoService.update_producto, producto_id, producto)
+    
+    @staticmethod
+    async def delete_producto(producto_id: str, modo: Optional[str] = None) -> Dict[str, str]:
+        """Elimina o archiva un producto"""
+        return await async_db_manager.write(ProductoService.delete_producto, producto_id, modo)
+    
+    @staticmethod
+    async def get_productos_bajo_stock(limit: Optional[int] = None) -> List[AlertaStock]:
+        """Obtiene los productos en o por debajo de su umbral, más urgentes primero"""
+        return await async_db_manager.read(ProductoService.get_productos_bajo_stock, limit)
+    
+    @staticmethod
+    async def get_productos_relacionados(producto_id: str, limit: int = 5) -> List[ProductoRelacionado]:
+        """Obtiene los productos comprados frecuentemente junto a otro"""
+        return await async_db_manager.read(ProductoService.get_productos_relacionados, producto_id, limit)
+
+class AsyncClienteService:
+    @staticmethod
+    async def get_all_clientes() -> List[Cliente]:
+        """Obtiene todos los clientes"""
+        return await async_db_manager.run(ClienteService.get_all_clientes)
+    
+    @staticmethod
+    async def get_cliente_by_id(cliente_id: str) -> Cliente:
+        """Obtiene un cliente por su ID"""
+        return await async_db_manager.read(ClienteService.get_cliente_by_id, cliente_id)
+    
+    @staticmethod
+    async def create_cliente(cliente: ClienteCreate) -> Cliente:
+        """Crea un nuevo cliente"""
+        return await async_db_manager.write(ClienteService.create_cliente, cliente)
+    
+    @staticmethod
+    async def update_cliente(cliente_id: str, cliente: ClienteCreate) -> Cliente:
+        """Actualiza un cliente existente"""
+        return await async_db_manager.write(ClienteService.update_cliente, cliente_id, cliente)
+    
+    @staticmethod
+    async def delete_cliente(cliente_id: str, modo: Optional[str] = None) -> Dict[str, str]:
+        """Elimina o archiva un cliente"""
+        return await async_db_manager.write(ClienteService.delete_cliente, cliente_id, modo)
+    
+    @staticmethod
+    async def buscar_cliente(email: Optional[str] = None, telefono: Optional[str] = None) -> Cliente:
+        """Busca un cliente por email o teléfono"""
+        return await async_db_manager.read(ClienteService.buscar_cliente, email, telefono)
+
+class AsyncVentaService:
+    @staticmethod
+    async def get_all_ventas(desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> List[Venta]:
+        """Obtiene todas las ventas, o solo las de un rango de fechas"""
+        return await async_db_manager.run(VentaService.get_all_ventas, desde, hasta)
+    
+    @staticmethod
+    async def get_historial(accept_encoding: Optional[str] = None, if_none_match: Optional[str] = None) -> Response:
+        """Historial completo cacheado; serializar y comprimir se hace fuera del bucle de eventos"""
+        return await async_db_manager.run(VentaService.get_historial, accept_encoding, if_none_match)
+    
+    @staticmethod
+    async def get_venta_by_id(venta_id: str) -> Venta:
+        """Obtiene una venta por su ID"""
+        return await async_db_manager.read(VentaService.get_venta_by_id, venta_id)
+    
+    @staticmethod
+    async def create_venta(venta: VentaCreate) -> Venta:
+        """Crea una nueva venta (validación y descuento de stock en una sola escritura)"""
+        return await async_db_manager.write_prioritaria(VentaService.create_venta, venta)
+    
+    @staticmethod
+    async def get_ventas_by_cliente(cliente_id: str) -> List[Venta]:
+        """Obtiene todas las ventas de un cliente específico"""
+        return await async_db_manager.run(VentaService.get_ventas_by_cliente, cliente_id)
+
+class AsyncReporteService:
+    @staticmethod
+    async def get_ventas_totales() -> ReporteVentas:
+        """Genera reporte de ventas totales"""
+        return await async_db_manager.run(ReporteService.get_ventas_totales)
+    
+    @staticmethod
+    async def get_ventas_por_periodo(agrupacion: str = "dia", desde: Optional[str] = None,
+                                     hasta: Optional[str] = None, limit: int = 10) -> ReporteVentasPeriodo:
+        """Genera el reporte de ventas agrupadas por periodo"""
+        return await async_db_manager.run(ReporteService.get_ventas_por_periodo, agrupacion, desde, hasta, limit)
+    
+    @staticmethod
+    async def get_productos_populares(limit: int = 10, categoria: Optional[str] = None,
+                                      ventana_minutos: Optional[int] = None) -> List[ProductoPopular]:
+        """Genera reporte de productos más populares"""
+        # Por categoría dentro de una ventana se filtran todos los productos vendidos en
+        # ella; los demás casos salen de un top ya mantenido
+        if categoria is not None and ventana_minutos is not None:
+            return await async_db_manager.run(ReporteService.get_productos_populares, limit, categoria, ventana_minutos)
+        return await async_db_manager.read(ReporteService.get_productos_populares, limit, categoria, ventana_minutos)
+    
+    @staticmethod
+    async def get_reporte_clientes(top: int = 10, orden: str = "monto", segmento: Optional[str] = None) -> ReporteClientes:
+        """Genera el reporte RFM de clientes (ordena y puntúa todos los clientes: fuera del bucle)"""
+        return await async_db_manager.run(ReporteService.get_reporte_clientes, top, orden, segmento)
@@ -1,9 +1,51 @@
+import os
+import re
+import threading
+import time
 import uuid
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from .config import settings
+
+# Expresiones precompiladas para las validaciones
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+# Acepta números, espacios, guiones y paréntesis
+PHONE_PATTERN = re.compile(r'^[\d\s\-\(\)\+]+$')
+NON_DIGITS = re.compile(r'\D')
+
+# Último (milisegundo, contador) emitido por uuid7, para que los ids del proceso sean crecientes
+_uuid7_lock = threading.Lock()
+_uuid7_ultimo = (0, 0)
+
+def uuid7() -> uuid.UUID:
+    """UUID versión 7 (RFC 9562): 48 bits de milisegundos Unix, versión, 12 bits de
+    contador dentro del milisegundo, variante y 62 bits aleatorios"""
+    global _uuid7_ultimo
+    with _uuid7_lock:
+        ms = time.time_ns() // 1_000_000
+        ultimo_ms, contador = _uuid7_ultimo
+        if ms <= ultimo_ms:
+            ms, contador = ultimo_ms, contador + 1
+            if contador > 0xFFF:
+                ms, contador = ultimo_ms + 1, 0
+        else:
+            # Arranca en la mitad baja para dejar margen al contador
+            contador = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        _uuid7_ultimo = (ms, contador)
+    aleatorio = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    return uuid.UUID(int=(ms << 80) | (0x7 << 76) | (contador << 64) | (0b10 << 62) | aleatorio)
+
+def uuid7_timestamp(id_: str) -> Optional[float]:
+    """Segundos desde epoch codificados en un UUIDv7, o None si el id es de otro tipo"""
+    if len(id_) != 36 or id_[14] != "7":
+        return None
+    return int(id_[:8] + id_[9:13], 16) / 1000
 
 def generate_id() -> str:
-    """Genera un ID único"""
+    """Genera un ID único (UUIDv4 o, con ID_FORMAT=uuid7, ordenado por tiempo)"""
+    if settings.ID_FORMAT == "uuid7":
+        return str(uuid7())
     return str(uuid.uuid4())
 
 def get_current_timestamp() -> str:
@@ -16,16 +58,19 @@ def format_currency(amount: float) -> str:
 
 def validate_email(email: str) -> bool:
     """Valida formato básico de email"""
-    import re
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
 
 def validate_phone(phone: str) -> bool:
     """Valida formato básico de teléfono"""
-    import re
-    # Acepta números, espacios, guiones y paréntesis
-    pattern = r'^[\d\s\-\(\)\+]+$'
-    return re.match(pattern, phone) is not None
+    return PHONE_PATTERN.match(phone) is not None
+
+def normalize_email(email: str) -> str:
+    """Forma canónica de un email para compararlo (sin espacios y en minúsculas)"""
+    return email.strip().lower()
+
+def phone_digits(phone: str) -> str:
+    """Deja solo los dígitos de un teléfono para compararlo"""
+    return NON_DIGITS.sub('', phone)
 
 def calculate_total(items: list) -> float:
     """Calcula el total de una lista de items"""
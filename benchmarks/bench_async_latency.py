@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga: latencia de lecturas durante una ráfaga de escrituras.
+
+Ejecuta la aplicación en el mismo proceso (httpx + ASGITransport) sobre una base
+de datos grande, de modo que cada escritura completa tarde decenas de
+milisegundos. Mide p50/p99 de ``GET /productos/{id}`` primero sin escrituras y
+luego mientras se envía una ráfaga de ``POST /productos/``. Con el almacenamiento
+asíncrono el p99 de lectura debe mantenerse plano.
+
+Uso: python benchmarks/bench_async_latency.py [--ventas 20000] [--escrituras 20]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def sembrar(db_file: str, productos: int, ventas: int) -> list:
+    from app.database import DatabaseManager
+
+    data = {
+        "productos": [
+            {"id": f"p{i}", "nombre": f"Producto {i}", "precio": 10.0, "stock": 10**6,
+             "categoria": "General", "fecha_creacion": "2024-01-01T00:00:00"}
+            for i in range(productos)
+        ],
+        "clientes": [],
+        "ventas": [
+            {"id": f"v{i}", "cliente_id": "c0", "total": 10.0, "fecha": "2024-01-01T00:00:00",
+             "estado": "completada",
+             "items": [{"producto_id": f"p{i % productos}", "cantidad": 1, "precio_unitario": 10.0}]}
+            for i in range(ventas)
+        ],
+    }
+    DatabaseManager(db_file).save_database(data)
+    return [p["id"] for p in data["productos"]]
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))] * 1000
+
+
+async def lector(client, ids: list, hasta: float, latencias: list) -> None:
+    i = 0
+    while time.perf_counter() < hasta:
+        inicio = time.perf_counter()
+        respuesta = await client.get(f"/productos/{ids[i % len(ids)]}")
+        latencias.append(time.perf_counter() - inicio)
+        assert respuesta.status_code == 200
+        i += 1
+        await asyncio.sleep(0.001)
+
+
+async def escritor(client, escrituras: int) -> float:
+    inicio = time.perf_counter()
+    nuevos = [{"nombre": f"Nuevo {i}", "precio": 1.0, "stock": 1, "categoria": "Bench"} for i in range(escrituras)]
+    respuestas = await asyncio.gather(*(client.post("/productos/", json=p) for p in nuevos))
+    assert all(r.status_code == 200 for r in respuestas)
+    return time.perf_counter() - inicio
+
+
+async def ejecutar(args) -> None:
+    import httpx
+    from app.main import app
+    from app.database import async_db_manager
+
+    await async_db_manager.open()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        ids = [f"p{i}" for i in range(args.productos)]
+
+        base = []
+        await asyncio.gather(*(lector(client, ids, time.perf_counter() + args.segundos, base)
+                               for _ in range(args.lectores)))
+
+        durante = []
+        hasta = time.perf_counter() + args.segundos
+        lectores = [lector(client, ids, hasta, durante) for _ in range(args.lectores)]
+        resultados = await asyncio.gather(escritor(client, args.escrituras), *lectores)
+    async_db_manager.close()
+
+    print(f"{'fase':<22} {'lecturas':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'sin escrituras':<22} {len(base):>9} {percentil(base, 0.50):>8.2f} {percentil(base, 0.99):>8.2f}")
+    print(f"{'ráfaga de escrituras':<22} {len(durante):>9} {percentil(durante, 0.50):>8.2f} {percentil(durante, 0.99):>8.2f}")
+    print(f"{args.escrituras} escrituras completadas en {resultados[0] * 1000:.0f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--productos", type=int, default=500)
+    parser.add_argument("--ventas", type=int, default=20000)
+    parser.add_argument("--escrituras", type=int, default=20)
+    parser.add_argument("--lectores", type=int, default=8)
+    parser.add_argument("--segundos", type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.json")
+        os.environ["DATABASE_FILE"] = db_file
+        # Todas las peticiones salen del mismo cliente: sin límites de tasa
+        os.environ.setdefault("LIMITES_ACTIVOS", "false")
+        sembrar(db_file, args.productos, args.ventas)
+        asyncio.run(ejecutar(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes enviados y latencia de ``GET /productos/`` según la codificación.
+
+Ejecuta la aplicación en el mismo proceso (httpx + ASGITransport) con catálogos
+de distintos tamaños. Para cada codificación aceptada por el cliente mide la
+primera petición tras un cambio en el catálogo (serializa y comprime) y la
+mediana de las siguientes (servidas desde la caché por versión de colección).
+Brotli y zstd solo aparecen si sus paquetes están instalados.
+
+Uso: python benchmarks/bench_compresion.py [--catalogos 10000,100000] [--repeticiones 20]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def sembrar(db_file: str, productos: int) -> None:
+    from app.database import DatabaseManager
+
+    DatabaseManager(db_file).save_database({
+        "productos": [
+            {"id": f"p{i}", "nombre": f"Producto {i}", "precio": 10.0 + i % 97, "stock": i % 50,
+             "categoria": f"Categoría {i % 20}", "fecha_creacion": "2024-01-01T00:00:00"}
+            for i in range(productos)
+        ],
+        "clientes": [],
+        "ventas": [],
+    })
+
+
+async def descargar(client, headers: dict):
+    """GET del catálogo leyendo los bytes tal como llegan, sin descomprimirlos en el cliente"""
+    async with client.stream("GET", "/productos/", headers=headers) as respuesta:
+        cuerpo = b"".join([fragmento async for fragmento in respuesta.aiter_raw()])
+    return cuerpo, respuesta.headers.get("content-encoding", "identity")
+
+
+async def medir(client, accept_encoding: str, repeticiones: int):
+    headers = {"Accept-Encoding": accept_encoding}
+    # Un cambio en el catálogo invalida la caché: la primera petición paga la compresión
+    nuevo = await client.post("/productos/", json={"nombre": "Nuevo", "precio": 1.0, "stock": 100, "categoria": "Bench"})
+    assert nuevo.status_code == 200
+    inicio = time.perf_counter()
+    cuerpo, codificacion = await descargar(client, headers)
+    fria = time.perf_counter() - inicio
+    latencias = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        await descargar(client, headers)
+        latencias.append(time.perf_counter() - inicio)
+    return len(cuerpo), codificacion, fria, statistics.median(latencias)
+
+
+async def ejecutar(productos: int, repeticiones: int) -> None:
+    import httpx
+    from app.main import app
+    from app.compresion import codificaciones_disponibles
+    from app.database import async_db_manager
+
+    await async_db_manager.open()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for accept_encoding in ("identity",) + codificaciones_disponibles():
+            bytes_enviados, codificacion, fria, caliente = await medir(client, accept_encoding, repeticiones)
+            print(f"{productos:>8} {codificacion:<9} {bytes_enviados / 1024:>10.0f} KiB "
+                  f"{fria * 1000:>10.1f} ms {caliente * 1000:>10.2f} ms")
+    async_db_manager.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalogos", default="10000,100000")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'productos':>8} {'codif.':<9} {'enviado':>14} {'1ª petición':>13} {'con caché':>13}")
+    for productos in (int(n) for n in args.catalogos.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, "bench.json")
+            os.environ["DATABASE_FILE"] = db_file
+            # Todas las peticiones salen del mismo cliente: sin límites de tasa
+            os.environ.setdefault("LIMITES_ACTIVOS", "false")
+            sembrar(db_file, productos)
+            # Cada tamaño usa una instancia nueva de la aplicación sobre su propia base
+            for modulo in [m for m in sys.modules if m == "app" or m.startswith("app.")]:
+                del sys.modules[modulo]
+            asyncio.run(ejecutar(productos, args.repeticiones))
+
+
+if __name__ == "__main__":
+    main()
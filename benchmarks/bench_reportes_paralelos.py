@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark: reporte de ventas por periodo sobre el historial particionado por mes.
+
+Genera en memoria un historial sintético repartido en varios meses, lo carga
+en ``Indices`` y mide el reporte completo sin caché, el mismo reporte con todos
+los parciales en caché y el reporte tras agregar ventas al mes en curso, que
+solo agrega esas ventas nuevas.
+
+Uso: python benchmarks/bench_reportes_paralelos.py [--ventas 2000000] [--meses 36] [--nuevas 100]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def generar_particiones(ventas: int, meses: int, productos: int) -> dict:
+    aleatorio = random.Random(42)
+    particiones = {}
+    for i in range(ventas):
+        mes = i * meses // ventas
+        anio, mes_del_anio = 2022 + mes // 12, mes % 12 + 1
+        fecha = f"{anio}-{mes_del_anio:02d}-{aleatorio.randint(1, 28):02d}T{aleatorio.randint(8, 21):02d}:00:00"
+        items = [{"producto_id": f"p{aleatorio.randrange(productos)}", "cantidad": aleatorio.randint(1, 3),
+                  "precio_unitario": 10.0} for _ in range(aleatorio.randint(1, 4))]
+        particiones.setdefault(fecha[:7], []).append({
+            "id": f"v{i}", "cliente_id": f"c{i % 1000}", "fecha": fecha, "estado": "completada",
+            "total": sum(item["cantidad"] * 10.0 for item in items), "items": items,
+        })
+    return particiones
+
+
+def medir(motor, indices, agrupacion: str = "dia"):
+    from app.reportes_paralelos import combinar
+
+    inicio = time.perf_counter()
+    cache = motor.cache()
+    resultado = combinar(motor.parciales(indices.particiones_por_mes(cache=cache), cache), agrupacion)
+    return time.perf_counter() - inicio, resultado
+
+
+def main() -> None:
+    from app.indices import Indices
+    from app.reportes_paralelos import MotorReportes
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ventas", type=int, default=2_000_000)
+    parser.add_argument("--meses", type=int, default=36)
+    parser.add_argument("--productos", type=int, default=5000)
+    parser.add_argument("--nuevas", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"Generando {args.ventas} ventas en {args.meses} meses...")
+    particiones = generar_particiones(args.ventas + args.nuevas, args.meses, args.productos)
+    ventas = [venta for mes in sorted(particiones) for venta in particiones[mes]]
+    historial, nuevas = ventas[:args.ventas], ventas[args.ventas:]
+    indices = Indices()
+    indices.reconstruir({"productos": [], "clientes": [], "ventas": historial})
+    motor = MotorReportes()
+
+    segundos, (total_ventas, _, _, periodos) = medir(motor, indices)
+    print(f"sin caché            {segundos * 1000:8.1f} ms  ({total_ventas} ventas, {len(periodos)} días)")
+    segundos, _ = medir(motor, indices)
+    print(f"con caché            {segundos * 1000:8.1f} ms")
+    for venta in nuevas:
+        indices.venta_agregada(venta)
+    segundos, (total_ventas, _, _, _) = medir(motor, indices)
+    print(f"+{len(nuevas):<5} ventas nuevas {segundos * 1000:8.1f} ms  ({total_ventas} ventas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque de la API.
+
+Mide dos cosas en procesos nuevos:
+  1. Tiempo de importación de ``app.main`` (mediana de varias ejecuciones).
+  2. Tiempo hasta la primera petición: desde que se lanza uvicorn hasta que
+     ``GET /productos/`` responde 200 (incluye el lifespan que abre la base).
+
+El tiempo hasta la primera petición se mide con una base vacía y con una base
+sembrada con ``--ventas`` ventas: al abrirla se reconstruyen los índices, las
+particiones por mes y el conteo de "comprados juntos", así que es lo que tarda
+en volver a atender una caja con historial real.
+
+Termina con código 1 si alguno de los dos tiempos supera su presupuesto.
+
+Uso: python benchmarks/bench_startup.py [--repeticiones 5] [--presupuesto-ms 1500]
+         [--ventas 100000] [--presupuesto-sembrado-ms 5000]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def sembrar(path: str, ventas: int, productos: int = 2000, clientes: int = 5000) -> None:
+    """Escribe una base con historial sintético de ``ventas`` ventas"""
+    sys.path.insert(0, ROOT)
+    from app.utils import uuid7
+
+    aleatorio = random.Random(42)
+    data = {
+        "productos": [{"id": f"p{i}", "nombre": f"Producto {i}", "precio": 10.0, "stock": 1000,
+                       "categoria": f"c{i % 20}", "fecha_creacion": "2022-01-01T00:00:00"}
+                      for i in range(productos)],
+        "clientes": [{"id": f"c{i}", "nombre": f"Cliente {i}", "email": f"cliente{i}@example.com",
+                      "telefono": f"55{i:08d}", "fecha_registro": "2022-01-01T00:00:00"}
+                     for i in range(clientes)],
+        "ventas": [],
+    }
+    for i in range(ventas):
+        # Dos años de historial en orden cronológico
+        dia = i * 730 // ventas
+        anio, resto = 2022 + dia // 365, dia % 365
+        fecha = f"{anio}-{resto // 31 + 1:02d}-{resto % 28 + 1:02d}T{aleatorio.randint(8, 21):02d}:00:00"
+        items = [{"producto_id": f"p{aleatorio.randrange(productos)}", "cantidad": aleatorio.randint(1, 3),
+                  "precio_unitario": 10.0} for _ in range(aleatorio.randint(1, 4))]
+        data["ventas"].append({
+            "id": str(uuid7()), "cliente_id": f"c{aleatorio.randrange(clientes)}", "fecha": fecha,
+            "estado": "completada", "total": sum(item["cantidad"] * 10.0 for item in items), "items": items,
+        })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def medir_importacion(env: dict) -> float:
+    salida = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return float(salida.stdout.strip())
+
+
+def medir_primera_peticion(env: dict, port: int) -> float:
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        while True:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                conn.request("GET", "/productos/")
+                if conn.getresponse().status == 200:
+                    return time.perf_counter() - inicio
+            except OSError:
+                pass
+            if proceso.poll() is not None:
+                raise RuntimeError("uvicorn terminó antes de responder")
+            time.sleep(0.005)
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--presupuesto-ms", type=float, default=1500.0)
+    parser.add_argument("--ventas", type=int, default=100_000)
+    parser.add_argument("--presupuesto-sembrado-ms", type=float, default=5000.0)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_FILE=os.path.join(tmp, "bench.json"), RELOAD="false")
+        importacion = [medir_importacion(env) for _ in range(args.repeticiones)]
+        primera = [medir_primera_peticion(env, args.port) for _ in range(args.repeticiones)]
+
+        sembrada = os.path.join(tmp, "sembrada.json")
+        sembrar(sembrada, args.ventas)
+        env = dict(env, DATABASE_FILE=sembrada)
+        primera_sembrada = [medir_primera_peticion(env, args.port) for _ in range(args.repeticiones)]
+
+    importacion_ms = statistics.median(importacion) * 1000
+    resultados = [
+        ("base vacía", statistics.median(primera) * 1000, args.presupuesto_ms),
+        (f"{args.ventas} ventas", statistics.median(primera_sembrada) * 1000, args.presupuesto_sembrado_ms),
+    ]
+    print(f"importación de app.main: {importacion_ms:8.1f} ms (mediana de {args.repeticiones})")
+    excedido = False
+    for nombre, primera_ms, presupuesto_ms in resultados:
+        estado = "OK" if primera_ms <= presupuesto_ms else "EXCEDIDO"
+        excedido = excedido or primera_ms > presupuesto_ms
+        print(f"primera petición, {nombre:>14}: {primera_ms:8.1f} ms "
+              f"(presupuesto {presupuesto_ms:.0f} ms) {estado}")
+    if excedido:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark de escalado por número de workers de uvicorn.
+
+Levanta el servidor con 1..N workers sobre una base de datos temporal y mide
+peticiones por segundo en una carga de solo lectura (GET /productos/ y
+GET /productos/{id}) con varios clientes concurrentes.
+
+Uso: python benchmarks/bench_workers.py [--max-workers 4] [--clientes 16] [--segundos 5]
+"""
+
+import argparse
+import http.client
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def sembrar_base_de_datos(db_file: str, productos: int) -> list:
+    """Crea una base de datos con productos de ejemplo y devuelve sus IDs"""
+    from app.database import DatabaseManager
+
+    db = DatabaseManager(db_file)
+    data = {
+        "productos": [
+            {
+                "id": f"p{i}",
+                "nombre": f"Producto {i}",
+                "precio": 10.0 + i % 50,
+                "stock": 100,
+                "categoria": f"Categoria {i % 10}",
+                "fecha_creacion": "2024-01-01T00:00:00",
+            }
+            for i in range(productos)
+        ],
+        "clientes": [],
+        "ventas": [],
+    }
+    db.save_database(data)
+    return [p["id"] for p in data["productos"]]
+
+
+def esperar_servidor(port: int, timeout: float = 20.0) -> None:
+    limite = time.time() + timeout
+    while time.time() < limite:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+def cliente(port: int, ids: list, hasta: float, contador: list, lock: threading.Lock) -> None:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    hechas = 0
+    while time.time() < hasta:
+        if random.random() < 0.2:
+            conn.request("GET", "/productos/")
+        else:
+            conn.request("GET", f"/productos/{random.choice(ids)}")
+        conn.getresponse().read()
+        hechas += 1
+    with lock:
+        contador[0] += hechas
+
+
+def medir(workers: int, port: int, db_file: str, ids: list, clientes: int, segundos: float) -> float:
+    env = dict(os.environ, DATABASE_FILE=db_file, RELOAD="false", WORKERS=str(workers))
+    # El generador de carga es un único cliente: sin límites de tasa
+    env.setdefault("LIMITES_ACTIVOS", "false")
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        esperar_servidor(port)
+        contador, lock = [0], threading.Lock()
+        hasta = time.time() + segundos
+        hilos = [threading.Thread(target=cliente, args=(port, ids, hasta, contador, lock))
+                 for _ in range(clientes)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return contador[0] / segundos
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--segundos", type=float, default=5.0)
+    parser.add_argument("--productos", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.json")
+        ids = sembrar_base_de_datos(db_file, args.productos)
+        base = None
+        print(f"{'workers':>8} {'req/s':>10} {'escalado':>9}")
+        for workers in range(1, args.max_workers + 1):
+            rps = medir(workers, args.port, db_file, ids, args.clientes, args.segundos)
+            base = base or rps
+            print(f"{workers:>8} {rps:>10.1f} {rps / base:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,5 +11,7 @@ if __name__ == "__main__":
         "app.main:app", 
         host=settings.HOST, 
         port=settings.PORT, 
-        reload=settings.RELOAD
+        reload=settings.should_reload(),
+        workers=settings.WORKERS,
+        timeout_keep_alive=settings.TIMEOUT_KEEP_ALIVE
     ) 
\ No newline at end of file
@@ -0,0 +1,50 @@
+import gzip
+import unittest
+from unittest.mock import patch
+
+from app.compresion import CacheRespuestas, codificaciones_aceptadas, elegir_codificacion
+
+
+class TestAcceptEncoding(unittest.TestCase):
+    def test_q_zero_is_excluded(self):
+        self.assertEqual(codificaciones_aceptadas('gzip;q=0, br;q=0.5, Deflate'), {'br', 'deflate'})
+
+    def test_falls_back_to_gzip_when_optional_modules_are_missing(self):
+        with patch('app.compresion.codificaciones_disponibles', return_value=('gzip',)):
+            self.assertEqual(elegir_codificacion('br, gzip'), 'gzip')
+            self.assertIsNone(elegir_codificacion('br'))
+            self.assertIsNone(elegir_codificacion(None))
+
+
+class TestCacheRespuestas(unittest.TestCase):
+    def setUp(self):
+        self.cache = CacheRespuestas()
+        self.serializaciones = 0
+        patcher = patch('app.compresion.codificaciones_disponibles', return_value=('gzip',))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def serializar(self):
+        self.serializaciones += 1
+        return b'[' + b'{"id":"1"},' * 500 + b'{"id":"2"}]'
+
+    def test_body_is_serialized_once_per_version(self):
+        primera = self.cache.respuesta('productos', 1, self.serializar, 'gzip')
+        self.cache.respuesta('productos', 1, self.serializar, 'gzip')
+        self.cache.respuesta('productos', 1, self.serializar, None)
+        self.assertEqual(self.serializaciones, 1)
+        self.assertEqual(primera.headers['content-encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(primera.body), self.serializar())
+        self.cache.respuesta('productos', 2, self.serializar, 'gzip')
+        self.assertEqual(self.serializaciones, 3)
+
+    def test_small_bodies_are_not_compressed(self):
+        with patch('app.compresion.settings.COMPRESION_MINIMA_BYTES', 10**6):
+            respuesta = self.cache.respuesta('productos', 1, self.serializar, 'gzip')
+        self.assertNotIn('content-encoding', respuesta.headers)
+
+    def test_matching_etag_returns_304(self):
+        etag = self.cache.respuesta('productos', 1, self.serializar, 'gzip').headers['etag']
+        respuesta = self.cache.respuesta('productos', 1, self.serializar, 'gzip', etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertNotEqual(etag, self.cache.respuesta('productos', 1, self.serializar, None).headers['etag'])
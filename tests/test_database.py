@@ -0,0 +1,467 @@
+import asyncio
+import os
+import stat
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from datetime import datetime
+
+from app.database import (MODO_ARCHIVOS_NUEVOS, ContadorVersion, DatabaseManager, AsyncDatabaseManager,
+                          RegistroDuplicadoError, RegistroInexistenteError, RegistroReferenciadoError,
+                          StockInsuficienteError, TurnosEscritura)
+from app.services import AsyncClienteService, AsyncReporteService
+from app.utils import uuid7
+
+
+class TestDatabaseManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, 'db.json')
+        self.db = DatabaseManager(self.db_file)
+        self.producto = {
+            'id': '1',
+            'nombre': 'TestProducto',
+            'precio': 9.99,
+            'stock': 5,
+            'categoria': 'CategoriaTest',
+            'fecha_creacion': '2021-01-01T00:00:00'
+        }
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_constructor_does_not_touch_filesystem(self):
+        path = os.path.join(self.tmp.name, 'lazy.json')
+        db = DatabaseManager(path)
+        self.assertFalse(os.path.exists(path))
+        db.open()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(db.get_productos(), [])
+
+    def test_concurrent_startup_does_not_overwrite_data(self):
+        # Otro worker crea la base y registra un producto entre la comprobación y el bloqueo
+        DatabaseManager(self.db_file).add_producto(self.producto)
+        with patch('app.database.os.path.exists', return_value=False):
+            self.db.open()
+        self.assertEqual(DatabaseManager(self.db_file).get_productos(), [self.producto])
+
+    def test_cache_reused_while_version_unchanged(self):
+        self.db.add_producto(self.producto)
+        self.assertIs(self.db.load_database(), self.db.load_database())
+
+    def test_other_instance_sees_new_version(self):
+        otro = DatabaseManager(self.db_file)
+        self.assertEqual(otro.get_productos(), [])
+        self.db.add_producto(self.producto)
+        self.assertEqual(otro.get_productos(), [self.producto])
+
+    def test_writes_do_not_mutate_previous_snapshot(self):
+        self.db.add_producto(self.producto)
+        snapshot = self.db.get_productos()
+        self.db.update_producto_stock('1', 2)
+        self.assertEqual(snapshot[0]['stock'], 5)
+        self.assertEqual(self.db.get_producto_by_id('1')['stock'], 3)
+
+    def test_writes_from_two_instances_are_not_lost(self):
+        otro = DatabaseManager(self.db_file)
+        self.db.add_producto(self.producto)
+        otro.add_producto(dict(self.producto, id='2'))
+        ids = [p['id'] for p in DatabaseManager(self.db_file).get_productos()]
+        self.assertEqual(ids, ['1', '2'])
+
+    def test_save_keeps_file_permissions(self):
+        self.db.add_producto(self.producto)
+        self.assertEqual(stat.S_IMODE(os.stat(self.db_file).st_mode), MODO_ARCHIVOS_NUEVOS)
+        os.chmod(self.db_file, 0o640)
+        self.db.update_producto_stock('1', 1)
+        self.assertEqual(stat.S_IMODE(os.stat(self.db_file).st_mode), 0o640)
+
+    def test_fsync_also_syncs_directory_after_rename(self):
+        db = DatabaseManager(self.db_file, fsync=True)
+        with patch('app.database.sincronizar_directorio') as sincronizar:
+            db.add_producto(self.producto)
+        sincronizar.assert_called_with(self.db_file)
+        with patch('app.database.sincronizar_directorio') as sincronizar:
+            self.db.update_producto_stock('1', 1)
+        sincronizar.assert_not_called()
+
+    def test_registrar_venta_updates_stock_and_ventas_in_one_write(self):
+        self.db.add_producto(self.producto)
+        self.db.add_cliente({'id': 'c1'})
+        version = self.db._read_version()
+        self.db.registrar_venta({'id': 'v1', 'cliente_id': 'c1', 'fecha': '2024-01-01T10:00:00', 'total': 3.0, 'items': [
+            {'producto_id': '1', 'cantidad': 2, 'precio_unitario': 1.0},
+            {'producto_id': '1', 'cantidad': 1, 'precio_unitario': 1.0},
+        ]})
+        self.assertEqual(self.db._read_version(), version + 1)
+        self.assertEqual(self.db.get_producto_by_id('1')['stock'], 2)
+        self.assertEqual(len(self.db.get_ventas()), 1)
+
+    def test_registrar_venta_validates_before_writing(self):
+        self.db.add_producto(self.producto)
+        self.db.add_cliente({'id': 'c1'})
+        version = self.db._read_version()
+        venta = {'id': 'v1', 'cliente_id': 'c1', 'fecha': '2024-01-01T10:00:00', 'total': 1.0,
+                 'items': [{'producto_id': '1', 'cantidad': 6, 'precio_unitario': 1.0}]}
+        with self.assertRaises(StockInsuficienteError):
+            self.db.registrar_venta(venta)
+        with self.assertRaises(RegistroInexistenteError) as ctx:
+            self.db.registrar_venta(dict(venta, cliente_id='c9'))
+        self.assertEqual(ctx.exception.coleccion, 'cliente')
+        self.assertEqual(self.db._read_version(), version)
+
+
+class TestContadorVersion(unittest.TestCase):
+    def test_shared_between_instances_and_upgrades_old_format(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'db.json.version')
+            with open(path, 'w') as f:
+                f.write('7')
+            uno, otro = ContadorVersion(path), ContadorVersion(path)
+            self.assertEqual(uno.leer(), 7)
+            self.assertEqual(otro.incrementar(), 8)
+            self.assertEqual(uno.leer(), 8)
+
+    def test_database_is_saved_compact(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(os.path.join(tmp, 'db.json'))
+            db.open()
+            with open(db.db_file, encoding='utf-8') as f:
+                self.assertEqual(f.read(), '{"productos":[],"clientes":[],"ventas":[]}')
+
+
+class TestGroupCommit(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, 'db.json')
+        self.db = DatabaseManager(self.db_file, group_commit_ms=50)
+        self.db.open()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_concurrent_writes_share_one_save(self):
+        version = self.db._read_version()
+        persistidos = []
+
+        def escribir(i):
+            self.db.add_cliente({'id': str(i)})
+            # Al volver, la escritura ya tiene que estar en disco
+            ids = [c['id'] for c in DatabaseManager(self.db_file).get_clientes()]
+            persistidos.append(str(i) in ids)
+
+        hilos = [threading.Thread(target=escribir, args=(i,)) for i in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(persistidos, [True] * 8)
+        self.assertEqual(len(DatabaseManager(self.db_file).get_clientes()), 8)
+        self.assertLess(self.db._read_version() - version, 8)
+
+    def test_failed_flush_is_reported_to_writer(self):
+        with patch.object(self.db, '_persist', side_effect=OSError('disco lleno')):
+            with self.assertRaises(OSError):
+                self.db.add_cliente({'id': '1'})
+        self.assertEqual(self.db.get_clientes(), [])
+        self.assertIsNone(self.db.get_cliente_by_id('1'))
+
+    def test_concurrent_sales_do_not_oversell(self):
+        self.db.add_producto({'id': 'p1', 'nombre': 'P', 'precio': 1.0, 'stock': 1, 'categoria': 'C',
+                              'fecha_creacion': '2021-01-01T00:00:00'})
+        self.db.add_cliente({'id': 'c1'})
+        resultados = []
+
+        def vender(i):
+            try:
+                self.db.registrar_venta({'id': f'v{i}', 'cliente_id': 'c1', 'fecha': '2024-01-01T10:00:00',
+                                         'total': 1.0, 'items': [{'producto_id': 'p1', 'cantidad': 1,
+                                                                  'precio_unitario': 1.0}]})
+                resultados.append('ok')
+            except StockInsuficienteError:
+                resultados.append('sin stock')
+
+        hilos = [threading.Thread(target=vender, args=(i,)) for i in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(sorted(resultados), ['ok'] + ['sin stock'] * 3)
+        self.assertEqual(DatabaseManager(self.db_file).get_producto_by_id('p1')['stock'], 0)
+
+    def test_pending_batch_is_not_visible_to_readers(self):
+        db = DatabaseManager(self.db_file, group_commit_ms=300)
+        db.open()
+        hilo = threading.Thread(target=db.add_cliente, args=({'id': '1', 'email': 'a@example.com'},))
+        hilo.start()
+        while db._lote is None:
+            time.sleep(0.001)
+        self.assertEqual(db.get_clientes(), [])
+        self.assertIsNone(db.get_cliente_by_id('1'))
+        self.assertTrue(db.is_fresh())
+        hilo.join()
+        self.assertEqual(db.get_cliente_by_id('1')['email'], 'a@example.com')
+
+    def test_checks_see_writes_pending_in_the_same_batch(self):
+        errores = []
+
+        def escribir(i):
+            try:
+                self.db.add_cliente({'id': str(i), 'email': 'mismo@example.com'})
+            except RegistroDuplicadoError as exc:
+                errores.append(exc.campo)
+
+        hilos = [threading.Thread(target=escribir, args=(i,)) for i in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(errores, ['email'] * 3)
+        self.assertEqual(len(DatabaseManager(self.db_file).get_clientes()), 1)
+
+
+class TestAsyncDatabaseManager(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manager = DatabaseManager(os.path.join(self.tmp.name, 'db.json'))
+        self.db = AsyncDatabaseManager(self.manager, max_workers=2)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    async def test_write_runs_in_executor_thread(self):
+        await self.db.open()
+        hilo = await self.db.write(lambda: threading.current_thread().name)
+        self.assertTrue(hilo.startswith('pos-db'))
+
+    async def test_fresh_read_stays_on_event_loop(self):
+        await self.db.open()
+        hilo = await self.db.read(lambda: threading.current_thread().name)
+        self.assertEqual(hilo, threading.current_thread().name)
+
+    async def test_listings_leave_the_event_loop(self):
+        await self.db.open()
+        with patch('app.services.async_db_manager', self.db), \
+                patch('app.services.ClienteService.get_all_clientes', lambda: threading.current_thread().name):
+            hilo = await AsyncClienteService.get_all_clientes()
+        self.assertTrue(hilo.startswith('pos-db'))
+
+    async def test_rfm_report_leaves_the_event_loop(self):
+        await self.db.open()
+        with patch('app.services.async_db_manager', self.db), \
+                patch('app.services.ReporteService.get_reporte_clientes',
+                      lambda *args: threading.current_thread().name):
+            hilo = await AsyncReporteService.get_reporte_clientes()
+        self.assertTrue(hilo.startswith('pos-db'))
+
+    async def test_stale_read_reloads_in_executor(self):
+        await self.db.open()
+        producto = {'id': '1', 'nombre': 'P', 'precio': 1.0, 'stock': 9, 'categoria': 'C',
+                    'fecha_creacion': '2021-01-01T00:00:00'}
+        DatabaseManager(self.manager.db_file).add_producto(producto)
+        self.assertFalse(self.manager.is_fresh())
+        productos = await self.db.read(self.manager.get_productos)
+        self.assertEqual(productos, [producto])
+
+
+    async def test_sale_writes_skip_the_queue(self):
+        await self.db.open()
+        liberar = threading.Event()
+        orden = []
+        # Ocupa el único turno de escritura y encola dos altas y una venta
+        en_curso = asyncio.create_task(self.db.write(liberar.wait))
+        await asyncio.sleep(0.01)
+        tareas = [asyncio.create_task(self.db.write(orden.append, 'alta')) for _ in range(2)]
+        tareas.append(asyncio.create_task(self.db.write_prioritaria(orden.append, 'venta')))
+        await asyncio.sleep(0.01)
+        liberar.set()
+        await asyncio.gather(en_curso, *tareas)
+        self.assertEqual(orden, ['venta', 'alta', 'alta'])
+        self.assertEqual(self.db.escrituras_pendientes, 0)
+
+
+class TestTurnosEscritura(unittest.IsolatedAsyncioTestCase):
+    async def test_one_slot_reserved_for_sales(self):
+        turnos = TurnosEscritura(2)
+        await turnos.adquirir()
+        normal = asyncio.create_task(turnos.adquirir())
+        await asyncio.sleep(0)
+        self.assertFalse(normal.done())
+        await turnos.adquirir(prioritaria=True)
+        self.assertEqual(turnos.en_curso, 2)
+        turnos.liberar()
+        turnos.liberar()
+        await normal
+        self.assertEqual(turnos.en_curso, 1)
+
+    async def test_cancelled_waiter_gives_up_its_turn(self):
+        turnos = TurnosEscritura(1)
+        await turnos.adquirir()
+        cancelada = asyncio.create_task(turnos.adquirir())
+        siguiente = asyncio.create_task(turnos.adquirir())
+        await asyncio.sleep(0)
+        cancelada.cancel()
+        await asyncio.sleep(0)
+        turnos.liberar()
+        await siguiente
+        self.assertEqual(turnos.en_curso, 1)
+
+
+class TestEventosInventario(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp.name, 'db.json'))
+        self.db.add_producto({'id': 'p1', 'nombre': 'P', 'precio': 1.0, 'stock': 9, 'stock_minimo': 3,
+                              'categoria': 'C', 'fecha_creacion': '2021-01-01T00:00:00'})
+        self.eventos = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_events_are_sent_after_commit_outside_the_lock(self):
+        def suscriptor(evento):
+            # La escritura ya es visible y el bloqueo de archivo está libre
+            self.eventos.append((evento.tipo, self.db.get_producto_by_id('p1')['stock'], self.db._lock_fd))
+
+        self.db.suscribir_inventario(suscriptor)
+        self.db.update_producto_stock('p1', 7)
+        self.assertEqual(self.eventos, [('bajo_stock', 2, None)])
+
+    def test_failed_save_sends_no_events(self):
+        self.db.suscribir_inventario(self.eventos.append)
+        with patch.object(self.db, '_persist', side_effect=OSError('disco lleno')):
+            with self.assertRaises(OSError):
+                self.db.update_producto_stock('p1', 9)
+        self.assertEqual(self.eventos, [])
+        self.assertEqual(self.db.get_producto_by_id('p1')['stock'], 9)
+
+    def test_failing_subscriber_does_not_fail_the_write(self):
+        self.db.suscribir_inventario(lambda evento: 1 / 0)
+        self.db.suscribir_inventario(self.eventos.append)
+        with self.assertLogs('app.inventario', level='ERROR'):
+            self.db.update_producto_stock('p1', 9)
+        self.assertEqual([e.tipo for e in self.eventos], ['bajo_stock', 'agotado'])
+
+
+class TestClientesUnicos(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp.name, 'db.json'))
+        self.db.add_cliente({'id': '1', 'nombre': 'Ana', 'email': 'Ana@Example.com',
+                             'telefono': '(55) 1234-5678', 'fecha_registro': '2021-01-01T00:00:00'})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_find_by_normalized_email_and_phone(self):
+        self.assertEqual(self.db.find_cliente(email=' ana@example.COM ')['id'], '1')
+        self.assertEqual(self.db.find_cliente(telefono='55-1234-5678')['id'], '1')
+        self.assertIsNone(self.db.find_cliente(email='otro@example.com'))
+
+    def test_duplicate_email_rejected_on_create(self):
+        with self.assertRaises(RegistroDuplicadoError) as ctx:
+            self.db.add_cliente({'id': '2', 'nombre': 'B', 'email': 'ana@example.com', 'telefono': '1'})
+        self.assertEqual(ctx.exception.campo, 'email')
+        self.assertEqual(len(self.db.get_clientes()), 1)
+
+    def test_duplicate_phone_rejected_on_update(self):
+        self.db.add_cliente({'id': '2', 'nombre': 'B', 'email': 'b@example.com', 'telefono': '1',
+                             'fecha_registro': '2021-01-01T00:00:00'})
+        with self.assertRaises(RegistroDuplicadoError) as ctx:
+            self.db.update_cliente('2', {'nombre': 'B', 'email': 'b@example.com', 'telefono': '551234 5678'})
+        self.assertEqual(ctx.exception.campo, 'telefono')
+
+    def test_update_keeping_own_email_is_allowed(self):
+        self.assertTrue(self.db.update_cliente('1', {'nombre': 'Ana M', 'email': 'ana@example.com',
+                                                     'telefono': '5512345678'}))
+        self.assertEqual(self.db.find_cliente(email='ana@example.com')['nombre'], 'Ana M')
+
+
+class TestReferencias(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp.name, 'db.json'))
+        self.db.add_producto({'id': 'p1', 'nombre': 'P1', 'precio': 1.0, 'stock': 9, 'categoria': 'C',
+                              'fecha_creacion': '2021-01-01T00:00:00'})
+        self.db.add_producto({'id': 'p2', 'nombre': 'P2', 'precio': 1.0, 'stock': 9, 'categoria': 'C',
+                              'fecha_creacion': '2021-01-01T00:00:00'})
+        self.db.add_cliente({'id': 'c1', 'nombre': 'Ana', 'email': 'ana@example.com', 'telefono': '1',
+                             'fecha_registro': '2021-01-01T00:00:00'})
+        self.db.registrar_venta({'id': 'v1', 'cliente_id': 'c1', 'fecha': '2024-01-01T10:00:00', 'total': 1.0,
+                                 'estado': 'completada',
+                                 'items': [{'producto_id': 'p1', 'cantidad': 1, 'precio_unitario': 1.0}]})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_reverse_indexes(self):
+        self.assertEqual(self.db.count_ventas_producto('p1'), 1)
+        self.assertEqual(self.db.count_ventas_producto('p2'), 0)
+        self.assertEqual([v['id'] for v in self.db.get_ventas_by_cliente('c1')], ['v1'])
+        self.assertEqual(self.db.get_venta_by_id('v1')['cliente_id'], 'c1')
+
+    def test_delete_referenced_is_rejected(self):
+        with self.assertRaises(RegistroReferenciadoError):
+            self.db.delete_producto('p1')
+        with self.assertRaises(RegistroReferenciadoError):
+            self.db.delete_cliente('c1')
+        self.assertTrue(self.db.delete_producto('p2'))
+
+    def test_archived_records_are_hidden_but_kept(self):
+        self.assertTrue(self.db.archive_producto('p1'))
+        self.assertTrue(self.db.archive_cliente('c1'))
+        self.assertEqual([p['id'] for p in self.db.get_productos()], ['p2'])
+        self.assertIsNone(self.db.get_producto_by_id('p1'))
+        self.assertEqual(self.db.get_producto_by_id('p1', incluir_archivados=True)['nombre'], 'P1')
+        self.assertEqual(self.db.get_clientes(), [])
+        self.assertIsNone(self.db.find_cliente(email='ana@example.com'))
+
+    def test_archived_state_survives_reload(self):
+        self.db.archive_producto('p1')
+        otro = DatabaseManager(self.db.db_file)
+        self.assertEqual([p['id'] for p in otro.get_productos()], ['p2'])
+        self.assertEqual(otro.count_ventas_producto('p1'), 1)
+
+
+class TestVentasPorRango(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp.name, 'db.json'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def venta(self, id_, fecha):
+        return {'id': id_, 'cliente_id': 'c1', 'fecha': fecha, 'total': 1.0, 'estado': 'completada', 'items': []}
+
+    def test_legacy_and_uuid7_sales_share_one_timeline(self):
+        self.db.add_venta(self.venta('legacy-1', '2024-01-01T10:00:00'))
+        self.db.add_venta(self.venta('legacy-2', '2024-02-01T10:00:00'))
+        nueva = self.venta(str(uuid7()), datetime.now().isoformat())
+        self.db.add_venta(nueva)
+        desde = datetime(2024, 1, 15).timestamp()
+        self.assertEqual([v['id'] for v in self.db.get_ventas_entre(desde)], ['legacy-2', nueva['id']])
+        self.assertEqual([v['id'] for v in self.db.get_ventas_entre(None, desde)], ['legacy-1'])
+
+    def test_late_sale_is_stored_in_order(self):
+        self.db.add_venta(self.venta('v2', '2024-02-01T10:00:00'))
+        self.db.add_venta(self.venta('v1', '2024-01-01T10:00:00'))
+        self.assertEqual([v['id'] for v in self.db.get_ventas()], ['v1', 'v2'])
+        recargada = DatabaseManager(self.db.db_file)
+        self.assertEqual([v['id'] for v in recargada.get_ventas_entre()], ['v1', 'v2'])
+
+
+class TestVersionColeccion(unittest.TestCase):
+    def test_only_the_written_collection_changes_version(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(os.path.join(tmp, 'db.json'))
+            productos, ventas = db.version_coleccion('productos'), db.version_coleccion('ventas')
+            db.add_producto({'id': '1', 'nombre': 'P', 'precio': 1.0, 'stock': 9, 'categoria': 'C',
+                             'fecha_creacion': '2021-01-01T00:00:00'})
+            self.assertGreater(db.version_coleccion('productos'), productos)
+            self.assertEqual(db.version_coleccion('ventas'), ventas)
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from app.database import AsyncDatabaseManager, DatabaseManager
+from app.idempotencia import CacheIdempotencia, IdempotenciaMiddleware, RegistroIdempotencia
+
+
+def crear_app(db):
+    app = FastAPI()
+    app.add_middleware(IdempotenciaMiddleware, db=db)
+    app.state.llamadas = 0
+
+    @app.post('/ventas/')
+    async def crear_venta(venta: dict):
+        app.state.llamadas += 1
+        await asyncio.sleep(0.01)
+        return {'numero': app.state.llamadas, **venta}
+
+    return app
+
+
+class TestCacheIdempotencia(unittest.TestCase):
+    def test_lru_eviction_and_expiry(self):
+        cache = CacheIdempotencia(max_entradas=2)
+        for clave in 'abc':
+            cache.guardar({'clave': clave, 'expira': float('inf')})
+        self.assertIsNone(cache.obtener('a'))
+        cache.guardar({'clave': 'd', 'expira': 0})
+        self.assertIsNone(cache.obtener('d'))
+        self.assertEqual(len(cache), 1)
+
+
+class TestRegistroIdempotencia(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'db.json.idempotencia')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def entrada(self, clave, expira=float('inf')):
+        return {'clave': clave, 'huella': 'h', 'status': 200, 'media_type': None, 'cuerpo': '{}', 'expira': expira}
+
+    def test_entries_appended_by_other_process_are_seen(self):
+        uno, otro = RegistroIdempotencia(self.path, 10), RegistroIdempotencia(self.path, 10)
+        self.assertIsNone(otro.obtener('k1'))
+        uno.guardar(self.entrada('k1'))
+        self.assertEqual(otro.obtener('k1')['clave'], 'k1')
+
+    def test_claim_is_seen_by_other_process_until_released(self):
+        uno, otro = RegistroIdempotencia(self.path, 10), RegistroIdempotencia(self.path, 10)
+        pendiente = {'clave': 'k1', 'huella': 'h', 'pendiente': True, 'expira': float('inf')}
+        self.assertIsNone(uno.reclamar(pendiente))
+        self.assertTrue(otro.reclamar(dict(pendiente))['pendiente'])
+        uno.liberar('k1')
+        self.assertIsNone(otro.obtener('k1'))
+        self.assertIsNone(otro.reclamar(dict(pendiente)))
+
+    def test_expired_claim_can_be_taken_over(self):
+        uno, otro = RegistroIdempotencia(self.path, 10), RegistroIdempotencia(self.path, 10)
+        self.assertIsNone(uno.reclamar({'clave': 'k1', 'huella': 'h', 'pendiente': True, 'expira': 0}))
+        self.assertIsNone(otro.reclamar({'clave': 'k1', 'huella': 'h', 'pendiente': True, 'expira': float('inf')}))
+
+    def test_compaction_drops_expired_and_oldest(self):
+        registro, otro = RegistroIdempotencia(self.path, 2), RegistroIdempotencia(self.path, 2)
+        registro.guardar(self.entrada('vencida', expira=0))
+        for clave in ('a', 'b', 'c', 'd'):
+            registro.guardar(self.entrada(clave))
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 2)
+        self.assertIsNone(otro.obtener('a'))
+        self.assertEqual(otro.obtener('d')['clave'], 'd')
+
+    def test_compaction_syncs_directory_with_fsync(self):
+        registro = RegistroIdempotencia(self.path, 1)
+        with patch('app.idempotencia.settings.DB_FSYNC', True), \
+                patch('app.idempotencia.sincronizar_directorio') as sincronizar:
+            for clave in ('a', 'b', 'c'):
+                registro.guardar(self.entrada(clave))
+        sincronizar.assert_called_with(self.path)
+
+
+class TestIdempotenciaMiddleware(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, 'db.json')
+        self.db = AsyncDatabaseManager(DatabaseManager(self.db_file), max_workers=2)
+        await self.db.open()
+        self.app = crear_app(self.db)
+
+    async def asyncTearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def cliente(self, app=None):
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app or self.app), base_url='http://test')
+
+    async def test_replay_returns_stored_response(self):
+        async with self.cliente() as cliente:
+            primera = await cliente.post('/ventas/', json={'total': 5}, headers={'Idempotency-Key': 'k1'})
+            repetida = await cliente.post('/ventas/', json={'total': 5}, headers={'Idempotency-Key': 'k1'})
+        self.assertEqual(repetida.json(), primera.json())
+        self.assertEqual(repetida.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.app.state.llamadas, 1)
+
+    async def test_requests_without_key_are_not_deduplicated(self):
+        async with self.cliente() as cliente:
+            await cliente.post('/ventas/', json={'total': 5})
+            await cliente.post('/ventas/', json={'total': 5})
+        self.assertEqual(self.app.state.llamadas, 2)
+
+    async def test_key_reused_with_other_body_is_rejected(self):
+        async with self.cliente() as cliente:
+            await cliente.post('/ventas/', json={'total': 5}, headers={'Idempotency-Key': 'k1'})
+            otra = await cliente.post('/ventas/', json={'total': 6}, headers={'Idempotency-Key': 'k1'})
+        self.assertEqual(otra.status_code, 422)
+
+    async def test_concurrent_retry_waits_for_original(self):
+        async with self.cliente() as cliente:
+            respuestas = await asyncio.gather(*[
+                cliente.post('/ventas/', json={'total': 5}, headers={'Idempotency-Key': 'k1'}) for _ in range(3)
+            ])
+        self.assertEqual({r.json()['numero'] for r in respuestas}, {1})
+        self.assertEqual(self.app.state.llamadas, 1)
+
+    async def test_retry_on_other_worker_waits_for_original(self):
+        # Dos middlewares sobre el mismo archivo se comportan como dos workers
+        db = AsyncDatabaseManager(DatabaseManager(self.db_file), max_workers=2)
+        self.addCleanup(db.close)
+        otro = crear_app(db)
+        async with self.cliente() as uno, self.cliente(otro) as dos:
+            respuestas = await asyncio.gather(
+                uno.post('/ventas/', json={'total': 5}, headers={'Idempotency-Key': 'k1'}),
+                dos.post('/ventas/', json={'total': 5}, headers={'Idempotency-Key': 'k1'}),
+            )
+        self.assertEqual([r.json()['numero'] for r in respuestas], [1, 1])
+        self.assertEqual(self.app.state.llamadas + otro.state.llamadas, 1)
+
+    async def test_server_error_releases_claim(self):
+        @self.app.post('/fallida/')
+        async def fallida():
+            self.app.state.llamadas += 1
+            return JSONResponse({'detail': 'error'}, status_code=500)
+
+        db = AsyncDatabaseManager(DatabaseManager(self.db_file), max_workers=2)
+        self.addCleanup(db.close)
+        registro = IdempotenciaMiddleware(None, db=db).registro
+        async with self.cliente() as cliente:
+            await cliente.post('/fallida/', json={}, headers={'Idempotency-Key': 'k1'})
+            self.assertIsNone(registro.obtener('POST /fallida/ k1'))
+            await cliente.post('/fallida/', json={}, headers={'Idempotency-Key': 'k1'})
+        self.assertEqual(self.app.state.llamadas, 2)
+
+    async def test_stored_response_survives_restart(self):
+        async with self.cliente() as cliente:
+            await cliente.post('/ventas/', json={'total': 5}, headers={'Idempotency-Key': 'k1'})
+        db = AsyncDatabaseManager(DatabaseManager(self.db_file), max_workers=1)
+        reiniciada = crear_app(db)
+        async with self.cliente(reiniciada) as cliente:
+            repetida = await cliente.post('/ventas/', json={'total': 5}, headers={'Idempotency-Key': 'k1'})
+        db.close()
+        self.assertEqual(repetida.json()['numero'], 1)
+        self.assertEqual(reiniciada.state.llamadas, 0)
+
+    async def test_saving_response_does_not_rewrite_database(self):
+        version = self.db.manager._read_version()
+        async with self.cliente() as cliente:
+            await cliente.post('/ventas/', json={'total': 5}, headers={'Idempotency-Key': 'k1'})
+        self.assertEqual(self.db.manager._read_version(), version)
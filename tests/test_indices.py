@@ -0,0 +1,206 @@
+import unittest
+from unittest.mock import patch
+
+from app.indices import Indices, VentanaDeslizante, top_k
+
+
+def producto(pid, categoria='General'):
+    return {'id': pid, 'nombre': f'Producto {pid}', 'precio': 1.0, 'stock': 10,
+            'categoria': categoria, 'fecha_creacion': '2024-01-01T00:00:00'}
+
+
+def venta(vid, fecha, *items):
+    return {'id': vid, 'cliente_id': 'c1', 'fecha': fecha, 'total': 0.0, 'estado': 'completada',
+            'items': [{'producto_id': pid, 'cantidad': cant, 'precio_unitario': 1.0} for pid, cant in items]}
+
+
+class TestTopK(unittest.TestCase):
+    def test_top_k_orders_by_count(self):
+        self.assertEqual(top_k({'a': 1, 'b': 5, 'c': 3}, 2), [('b', 5), ('c', 3)])
+
+    def test_top_k_with_filter(self):
+        self.assertEqual(top_k({'a': 1, 'b': 5, 'c': 3}, 2, lambda pid: pid != 'b'), [('c', 3), ('a', 1)])
+
+
+class TestVentanaDeslizante(unittest.TestCase):
+    def test_expired_events_are_discounted(self):
+        ventana = VentanaDeslizante(1)
+        ventana.agregar(0, 'a', 2)
+        ventana.agregar(30, 'b', 1)
+        ventana.agregar(45, 'a', 1)
+        self.assertEqual(ventana.top(5, 50), [('a', 3), ('b', 1)])
+        self.assertEqual(ventana.top(5, 70), [('a', 1), ('b', 1)])
+        self.assertEqual(ventana.top(5, 200), [])
+        self.assertEqual(len(ventana.eventos), 0)
+
+
+class TestIndicesPopulares(unittest.TestCase):
+    def setUp(self):
+        self.indices = Indices(ventanas_minutos=[60])
+        self.indices.reconstruir({
+            'productos': [producto('a', 'Bebidas'), producto('b', 'Snacks'), producto('c', 'Bebidas')],
+            'clientes': [],
+            'ventas': [
+                venta('v1', '2024-01-01T10:00:00', ('a', 2), ('b', 5)),
+                venta('v2', '2024-01-01T11:00:00', ('c', 3)),
+            ],
+        })
+
+    def test_top_all_time(self):
+        self.assertEqual(self.indices.top_productos(2), [('b', 5), ('c', 3)])
+
+    def test_top_by_categoria(self):
+        self.assertEqual(self.indices.top_productos(5, 'Bebidas'), [('c', 3), ('a', 2)])
+
+    def test_categoria_change_moves_counts(self):
+        anterior = self.indices.productos['a']
+        self.indices.producto_cambiado(anterior, dict(anterior, categoria='Snacks'))
+        self.assertEqual(self.indices.top_productos(5, 'Bebidas'), [('c', 3)])
+        self.assertEqual(self.indices.top_productos(5, 'Snacks'), [('b', 5), ('a', 2)])
+
+    def test_ventana_only_counts_recent_sales(self):
+        with patch('app.indices.time.time', return_value=1_000_000.0):
+            reciente = venta('v3', '2024-01-01T12:00:00', ('a', 1))
+            reciente_ts = 1_000_000.0 - 60
+            with patch('app.indices.venta_timestamp', return_value=reciente_ts):
+                self.indices.venta_agregada(reciente)
+            self.assertEqual(self.indices.top_productos(5, ventana_minutos=60), [('a', 1)])
+            self.assertEqual(self.indices.top_productos(5, 'Snacks', ventana_minutos=60), [])
+
+
+class TestIndiceInventario(unittest.TestCase):
+    def setUp(self):
+        self.indices = Indices(ventanas_minutos=[60])
+        self.eventos = []
+        self.indices.inventario.suscriptores = [self.eventos.append]
+        self.indices.reconstruir({
+            'productos': [dict(producto('a'), stock=10, stock_minimo=3),
+                          dict(producto('b'), stock=2, stock_minimo=5),
+                          dict(producto('c'), stock=4, stock_minimo=4)],
+            'clientes': [],
+            'ventas': [],
+        })
+
+    def cambiar_stock(self, pid, stock):
+        anterior = self.indices.productos[pid]
+        self.indices.inventario.emitir(self.indices.producto_cambiado(anterior, dict(anterior, stock=stock)))
+
+    def bajo_stock(self, limit=None):
+        return [(p['id'], p['stock'], umbral) for p, umbral in self.indices.bajo_stock(limit)]
+
+    def test_rebuild_lists_low_products_without_events(self):
+        self.assertEqual(self.bajo_stock(), [('b', 2, 5), ('c', 4, 4)])
+        self.assertEqual(self.eventos, [])
+
+    def test_crossing_threshold_emits_event(self):
+        self.cambiar_stock('a', 3)
+        self.assertEqual([e.tipo for e in self.eventos], ['bajo_stock'])
+        self.assertEqual(self.bajo_stock(1), [('b', 2, 5)])
+        self.assertIn(('a', 3, 3), self.bajo_stock())
+
+    def test_negative_stock_and_restock_events(self):
+        self.cambiar_stock('b', -1)
+        self.assertEqual([e.tipo for e in self.eventos], ['agotado', 'stock_negativo'])
+        self.cambiar_stock('b', 20)
+        self.assertEqual(self.eventos[-1].tipo, 'repuesto')
+        self.assertEqual(self.bajo_stock(), [('c', 4, 4)])
+
+    def test_reentering_low_stock_is_listed_once(self):
+        for stock in (10, 4, 10, 4):
+            self.cambiar_stock('c', stock)
+        self.assertEqual(self.bajo_stock(), [('b', 2, 5), ('c', 4, 4)])
+
+
+class TestRFM(unittest.TestCase):
+    def setUp(self):
+        self.indices = Indices(ventanas_minutos=[60])
+        ventas = []
+        # c1 compra mucho y reciente, c5 una sola vez hace tiempo
+        for i, (cliente, fecha, total) in enumerate([
+            ('c1', '2024-06-01T10:00:00', 500.0), ('c1', '2024-06-10T10:00:00', 300.0),
+            ('c1', '2024-06-20T10:00:00', 200.0), ('c2', '2024-06-18T10:00:00', 50.0),
+            ('c3', '2024-03-01T10:00:00', 80.0), ('c3', '2024-03-05T10:00:00', 90.0),
+            ('c4', '2024-05-01T10:00:00', 20.0), ('c5', '2024-01-01T10:00:00', 10.0),
+        ]):
+            v = venta(f'v{i}', fecha, ('a', 1))
+            v.update(cliente_id=cliente, total=total)
+            ventas.append(v)
+        clientes = [{'id': f'c{i}', 'nombre': f'C{i}'} for i in range(1, 6)]
+        self.indices.reconstruir({'productos': [producto('a')], 'clientes': clientes, 'ventas': ventas})
+
+    def test_running_stats(self):
+        stats = self.indices.estadisticas_clientes['c1']
+        self.assertEqual(stats.pedidos, 3)
+        self.assertEqual(stats.gasto_total, 1000.0)
+        self.assertEqual(stats.ultima_fecha, '2024-06-20T10:00:00')
+
+    def test_new_sale_updates_stats(self):
+        v = venta('v9', '2024-07-01T10:00:00', ('a', 1))
+        v.update(cliente_id='c5', total=5.0)
+        self.indices.venta_agregada(v)
+        stats = self.indices.estadisticas_clientes['c5']
+        self.assertEqual((stats.pedidos, stats.gasto_total, stats.ultima_fecha), (2, 15.0, '2024-07-01T10:00:00'))
+
+    def test_segments(self):
+        segmentos = {fila[0]: fila[5] for fila in self.indices.rfm_clientes()}
+        self.assertEqual(segmentos['c1'], 'campeones')
+        self.assertEqual(segmentos['c5'], 'perdidos')
+
+    def test_archived_clientes_are_left_out(self):
+        anterior = self.indices.clientes['c5']
+        self.indices.cliente_cambiado(anterior, dict(anterior, archivado=True))
+        self.assertEqual(sorted(fila[0] for fila in self.indices.rfm_clientes()), ['c1', 'c2', 'c3', 'c4'])
+
+
+class TestCoocurrencias(unittest.TestCase):
+    def setUp(self):
+        self.indices = Indices(ventanas_minutos=[60])
+        self.ventas = [
+            venta('v1', '2024-06-01T10:00:00', ('a', 1), ('b', 2)),
+            venta('v2', '2024-06-01T11:00:00', ('a', 1), ('b', 1), ('c', 1)),
+            venta('v3', '2024-06-01T12:00:00', ('a', 1), ('c', 1), ('a', 2)),
+            venta('v4', '2024-06-01T13:00:00', ('a', 1), ('b', 1)),
+        ]
+        self.data = {'productos': [producto(p) for p in 'abcd'], 'clientes': [], 'ventas': self.ventas}
+        self.indices.reconstruir(self.data)
+
+    def test_related_ordered_by_times_bought_together(self):
+        relacionados = [(p['id'], veces) for p, veces in self.indices.relacionados('a', 5)]
+        self.assertEqual(relacionados, [('b', 3), ('c', 2)])
+
+    def test_new_sale_updates_pairs(self):
+        self.indices.venta_agregada(venta('v5', '2024-06-01T14:00:00', ('d', 1), ('a', 1)))
+        self.indices.venta_agregada(venta('v6', '2024-06-01T15:00:00', ('c', 1), ('d', 1)))
+        self.assertEqual([(p['id'], veces) for p, veces in self.indices.relacionados('d', 5)], [('a', 1), ('c', 1)])
+
+    def test_archived_partners_are_skipped(self):
+        self.indices.producto_cambiado(producto('b'), dict(producto('b'), archivado=True))
+        self.assertEqual([p['id'] for p, _ in self.indices.relacionados('a', 5)], ['c'])
+
+    def test_partners_are_bounded(self):
+        with patch('app.indices.settings.RELACIONADOS_TOP_K', 2):
+            indices = Indices(ventanas_minutos=[60])
+            indices.reconstruir({'productos': [], 'clientes': [], 'ventas': []})
+        for i in range(20):
+            indices.venta_agregada(venta(f'v{i}', '2024-06-01T10:00:00', ('a', 1), (f'p{i}', 1)))
+        self.assertLessEqual(len(indices.coocurrencias.pares['a']), indices.coocurrencias.capacidad)
+
+    def test_parallel_rebuild_matches_sequential(self):
+        self.indices.preparar_coocurrencias()
+        secuencial = {pid: dict(c) for pid, c in self.indices.coocurrencias.pares.items()}
+        with patch('app.indices.settings.COOCURRENCIA_UMBRAL_PARALELO', 1):
+            self.indices.preparar_coocurrencias(procesos=2)
+        self.assertEqual(self.indices.coocurrencias.pares, secuencial)
+
+    def test_reload_only_counts_new_sales(self):
+        self.indices.preparar_coocurrencias()
+        nueva = venta('v5', '2024-06-01T14:00:00', ('d', 1), ('b', 1))
+        with patch('app.indices.contar_pares', side_effect=AssertionError('conteo completo')):
+            self.indices.reconstruir(dict(self.data, ventas=self.ventas + [nueva]))
+        self.assertEqual([(p['id'], veces) for p, veces in self.indices.relacionados('d', 5)], [('b', 1)])
+
+    def test_replaced_history_is_counted_again_on_demand(self):
+        self.indices.preparar_coocurrencias()
+        self.indices.reconstruir(dict(self.data, ventas=self.ventas[:1]))
+        self.assertIsNone(self.indices.coocurrencias)
+        self.assertEqual([(p['id'], veces) for p, veces in self.indices.relacionados('a', 5)], [('b', 1)])
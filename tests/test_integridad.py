@@ -0,0 +1,60 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app.integridad import main, verificar_integridad
+
+
+class TestVerificarIntegridad(unittest.TestCase):
+    def test_clean_store_has_no_problems(self):
+        data = {
+            'productos': [{'id': 'p1', 'stock': 1}],
+            'clientes': [{'id': 'c1'}],
+            'ventas': [{'id': 'v1', 'cliente_id': 'c1', 'items': [{'producto_id': 'p1', 'cantidad': 1}]}],
+        }
+        resultado = verificar_integridad(data)
+        self.assertEqual(resultado['problemas'], [])
+        self.assertEqual(resultado['ventas'], 1)
+
+    def test_orphans_duplicates_and_negative_stock_are_reported(self):
+        data = {
+            'productos': [{'id': 'p1', 'stock': -2}],
+            'clientes': [],
+            'ventas': [
+                {'id': 'v1', 'cliente_id': 'c9', 'items': [{'producto_id': 'p9', 'cantidad': 1}]},
+                {'id': 'v1', 'cliente_id': 'c9', 'items': []},
+            ],
+        }
+        problemas = verificar_integridad(data)['problemas']
+        self.assertEqual(len(problemas), 5)
+        self.assertTrue(any('stock negativo' in p for p in problemas))
+        self.assertTrue(any('Venta duplicada' in p for p in problemas))
+        self.assertTrue(any('producto inexistente p9' in p for p in problemas))
+
+
+class TestMain(unittest.TestCase):
+    def ejecutar(self, path):
+        with patch.object(sys, 'argv', ['integridad', '--db', path]), \
+                patch('sys.stdout', new=io.StringIO()), patch('sys.stderr', new=io.StringIO()):
+            with self.assertRaises(SystemExit) as ctx:
+                main()
+        return ctx.exception.code
+
+    def test_unreadable_file_is_reported_and_left_untouched(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'db.json')
+            with open(path, 'w') as f:
+                f.write('{"productos": [')
+            self.assertEqual(self.ejecutar(path), 2)
+            with open(path) as f:
+                self.assertEqual(f.read(), '{"productos": [')
+            self.assertEqual(os.listdir(tmp), ['db.json'])
+
+    def test_missing_file_is_not_created(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'db.json')
+            self.assertEqual(self.ejecutar(path), 2)
+            self.assertFalse(os.path.exists(path))
@@ -0,0 +1,92 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+from fastapi import FastAPI
+
+from app.limites import ALTA, BAJA, NORMAL, CuboTokens, LimitesMiddleware, MonitorCarga, prioridad_de
+
+
+def crear_app(db, monitor):
+    app = FastAPI()
+    app.add_middleware(LimitesMiddleware, db=db, monitor=monitor)
+
+    @app.post('/ventas/')
+    async def crear_venta():
+        return {'ok': True}
+
+    @app.post('/clientes/')
+    async def crear_cliente():
+        return {'ok': True}
+
+    @app.get('/productos/{producto_id}')
+    async def obtener_producto(producto_id: str):
+        return {'id': producto_id}
+
+    @app.get('/reportes/ventas-totales')
+    async def reporte():
+        return {'ok': True}
+
+    return app
+
+
+class TestCuboTokens(unittest.TestCase):
+    def test_burst_then_refill(self):
+        cubo = CuboTokens(tasa=2, capacidad=3, ahora=0)
+        self.assertEqual([cubo.consumir(0) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(cubo.consumir(0), 0.5)
+        self.assertEqual(cubo.consumir(0.5), 0)
+
+    def test_priorities(self):
+        self.assertEqual(prioridad_de('POST', '/ventas/'), ALTA)
+        self.assertEqual(prioridad_de('GET', '/ventas/'), NORMAL)
+        self.assertEqual(prioridad_de('GET', '/reportes/productos-populares'), BAJA)
+
+
+class TestLimitesMiddleware(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.db = SimpleNamespace(escrituras_pendientes=0)
+        self.monitor = MonitorCarga()
+        self.app = crear_app(self.db, self.monitor)
+        patcher = patch.multiple('app.limites.settings', LIMITES_ACTIVOS=True, LIMITE_TASA=1, LIMITE_RAFAGA=3,
+                                 CARGA_COLA_ESCRITURAS_MAX=4, CARGA_RETRASO_MAX_MS=100)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cliente(self):
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url='http://test')
+
+    async def test_bucket_per_route_template(self):
+        async with self.cliente() as cliente:
+            codigos = [(await cliente.get(f'/productos/p{i}')).status_code for i in range(4)]
+            venta = await cliente.post('/ventas/')
+            rechazada = await cliente.get('/productos/p9')
+        self.assertEqual(codigos, [200, 200, 200, 429])
+        self.assertEqual(venta.status_code, 200)
+        self.assertEqual(rechazada.headers['Retry-After'], '1')
+
+    async def test_write_queue_sheds_reports_first(self):
+        self.db.escrituras_pendientes = 4
+        async with self.cliente() as cliente:
+            reporte = await cliente.get('/reportes/ventas-totales')
+            producto = await cliente.get('/productos/p1')
+        self.assertEqual(reporte.status_code, 503)
+        self.assertIn('Retry-After', reporte.headers)
+        self.assertEqual(producto.status_code, 200)
+
+    async def test_write_queue_sheds_other_writes_before_sales(self):
+        self.db.escrituras_pendientes = 4
+        async with self.cliente() as cliente:
+            alta = await cliente.post('/clientes/')
+            venta = await cliente.post('/ventas/')
+        self.assertEqual(alta.status_code, 503)
+        self.assertEqual(venta.status_code, 200)
+
+    async def test_event_loop_lag_keeps_only_sales(self):
+        self.monitor.retraso_ms = 250
+        async with self.cliente() as cliente:
+            producto = await cliente.get('/productos/p1')
+            venta = await cliente.post('/ventas/')
+        self.assertEqual(producto.status_code, 503)
+        self.assertEqual(venta.status_code, 200)
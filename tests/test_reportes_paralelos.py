@@ -0,0 +1,56 @@
+import unittest
+
+from app.reportes_paralelos import MotorReportes, agregar_particion, combinar, ventas_nuevas
+
+
+def venta(vid, fecha, total, *items):
+    return {'id': vid, 'cliente_id': 'c1', 'fecha': fecha, 'total': total, 'estado': 'completada',
+            'items': [{'producto_id': pid, 'cantidad': cant, 'precio_unitario': 1.0} for pid, cant in items]}
+
+
+PARTICIONES = {
+    '2024-05': [venta('v1', '2024-05-30T09:15:00', 10.0, ('a', 2)),
+                venta('v2', '2024-05-30T09:45:00', 5.0, ('b', 1))],
+    '2024-06': [venta('v3', '2024-06-01T10:00:00', 20.0, ('a', 1), ('c', 4))],
+}
+
+
+class TestCombinar(unittest.TestCase):
+    def test_partial_aggregates(self):
+        ventas, ingresos, unidades, por_hora = agregar_particion(PARTICIONES['2024-05'])
+        self.assertEqual((ventas, ingresos, unidades), (2, 15.0, {'a': 2, 'b': 1}))
+        self.assertEqual(por_hora, {'2024-05-30T09': [2, 15.0]})
+
+    def test_reduce_regroups_periods(self):
+        parciales = [agregar_particion(v) for v in PARTICIONES.values()]
+        ventas, ingresos, unidades, periodos = combinar(parciales, 'mes')
+        self.assertEqual((ventas, ingresos), (3, 35.0))
+        self.assertEqual(unidades, {'a': 3, 'b': 1, 'c': 4})
+        self.assertEqual(periodos, {'2024-05': [2, 15.0], '2024-06': [1, 20.0]})
+
+
+class TestMotorReportes(unittest.TestCase):
+    def test_only_new_sales_are_aggregated(self):
+        motor = MotorReportes()
+        particiones = {mes: ventas[:] for mes, ventas in PARTICIONES.items()}
+        motor.reporte(particiones)
+        cacheado = motor._cache['2024-05'][2]
+        particiones['2024-06'].append(venta('v4', '2024-06-02T10:00:00', 1.0, ('b', 1)))
+        nuevas = ventas_nuevas(particiones, motor.cache())
+        self.assertEqual(nuevas['2024-05'], (2, []))
+        self.assertEqual([v['id'] for v in nuevas['2024-06'][1]], ['v4'])
+        ventas, _, unidades, periodos = motor.reporte(particiones, 'dia')
+        self.assertIs(motor._cache['2024-05'][2], cacheado)
+        self.assertEqual(ventas, 4)
+        self.assertEqual(unidades, {'a': 3, 'b': 2, 'c': 4})
+        self.assertEqual(periodos['2024-06-02'], [1, 1.0])
+        self.assertEqual(motor.reporte(particiones, 'hora'),
+                         combinar([agregar_particion(v) for v in particiones.values()], 'hora'))
+
+    def test_replaced_month_is_recomputed(self):
+        motor = MotorReportes()
+        motor.reporte(PARTICIONES)
+        particiones = dict(PARTICIONES, **{'2024-06': [venta('v9', '2024-06-03T10:00:00', 7.0, ('c', 1))]})
+        self.assertEqual(ventas_nuevas(particiones, motor.cache())['2024-06'][0], 0)
+        ventas, ingresos, _, _ = motor.reporte(particiones, 'mes')
+        self.assertEqual((ventas, ingresos), (3, 22.0))
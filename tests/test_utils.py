@@ -0,0 +1,29 @@
+import time
+import unittest
+import uuid
+from unittest.mock import patch
+
+from app.utils import generate_id, uuid7, uuid7_timestamp
+
+
+class TestUUID7(unittest.TestCase):
+    def test_version_variant_and_timestamp(self):
+        antes = time.time()
+        id_ = uuid7()
+        self.assertEqual(id_.version, 7)
+        self.assertEqual(id_.variant, uuid.RFC_4122)
+        self.assertAlmostEqual(uuid7_timestamp(str(id_)), antes, delta=1)
+
+    def test_ids_are_increasing_within_a_millisecond(self):
+        ids = [str(uuid7()) for _ in range(5000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_uuid4_has_no_timestamp(self):
+        self.assertIsNone(uuid7_timestamp(str(uuid.uuid4())))
+        self.assertIsNone(uuid7_timestamp('v1'))
+
+    def test_generate_id_follows_setting(self):
+        with patch('app.utils.settings.ID_FORMAT', 'uuid7'):
+            self.assertEqual(uuid.UUID(generate_id()).version, 7)
+        self.assertEqual(uuid.UUID(generate_id()).version, 4)